@@ -0,0 +1,62 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from mobmetric import real_entropy, radius_gyration, jump_length, set_backend
+
+from benchmarks.synthetic import generate_staypoints
+
+
+def run_backend(backend, sp, n_jobs):
+    """Results and wall times of the kernel functions with the given backend."""
+    set_backend(backend)
+    results, times = {}, {}
+    for name, func in [
+        ("real_entropy", lambda: real_entropy(sp, n_jobs=n_jobs).values),
+        ("radius_gyration", lambda: radius_gyration(sp).values),
+        ("jump_length", lambda: jump_length(sp)),
+    ]:
+        start = time.perf_counter()
+        results[name] = func()
+        times[name] = time.perf_counter() - start
+    return results, times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the numerical equivalence of the numba and numpy backends.")
+    parser.add_argument(
+        "--users",
+        default=[10, 100, 1000],
+        type=int,
+        nargs="+",
+        help="Number of users of each synthetic dataset (default: %(default)s)",
+    )
+    parser.add_argument("--seeds", default=[0, 1], type=int, nargs="+", help="Seeds (default: %(default)s)")
+    parser.add_argument("--n-jobs", default=1, type=int, help="Number of parallel jobs (default: %(default)s)")
+    args = parser.parse_args()
+
+    failed = False
+    for n_users in args.users:
+        for seed in args.seeds:
+            sp = generate_staypoints(n_users, seed=seed)
+            # small location sets create long repeated patterns
+            sp["location_id"] = sp["location_id"] % (seed + 3)
+
+            # compile the kernels before timing
+            run_backend("numba", sp.iloc[:100], args.n_jobs)
+            numba_results, numba_times = run_backend("numba", sp, args.n_jobs)
+            numpy_results, numpy_times = run_backend("numpy", sp, args.n_jobs)
+
+            for name in numpy_results:
+                # real entropy is exact, distances may differ in the last digits
+                rtol = 0 if name == "real_entropy" else 1e-9
+                equal = np.allclose(numba_results[name], numpy_results[name], rtol=rtol, atol=0, equal_nan=True)
+                failed |= not equal
+                print(
+                    f"{name:<18}{n_users:>6} users seed {seed}: {'equal' if equal else 'DIFFERENT'}, "
+                    f"numba {numba_times[name]:.4f}s, numpy {numpy_times[name]:.4f}s"
+                )
+
+    sys.exit(1 if failed else 0)
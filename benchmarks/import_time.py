@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+# dependencies that shall only be imported by the functions that need them
+HEAVY_MODULES = ["trackintel", "geopandas", "shapely", "networkx", "joblib", "tqdm", "numba", "scipy", "matplotlib"]
+
+# import statements measured in a fresh interpreter each
+STATEMENTS = [
+    "import numpy, pandas",
+    "import mobmetric",
+    "from mobmetric import uncorrelated_entropy",
+    "from mobmetric import real_entropy",
+    "from mobmetric import radius_gyration",
+    "from mobmetric import mobility_motifs",
+    "from mobmetric import compute_metrics",
+    "from mobmetric import read_staypoints",
+    "from mobmetric import *",
+    "import mobmetric.cli",
+    # the spatial metrics of plain DataFrames with the numpy backend do not require geopandas or trackintel
+    "import pandas as pd, mobmetric; mobmetric.set_backend('numpy'); "
+    "sp = pd.DataFrame({'user_id': [0, 0, 1], 'lat': [47.3, 47.4, 47.5], 'lng': [8.5, 8.6, 8.7]}); "
+    "mobmetric.radius_gyration(sp); mobmetric.jump_length(sp)",
+]
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "modules": [m for m in {heavy} if m in sys.modules]}}))
+"""
+
+
+def measure(statement, repeat):
+    """
+    Wall time of an import statement in a fresh interpreter (minimum over repeat runs), and the heavy modules it loads.
+    """
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", SCRIPT.format(statement=statement, heavy=HEAVY_MODULES)],
+            capture_output=True,
+            text=True,
+            check=True,
+            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result["seconds"])
+    return min(times), result["modules"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the import time of mobmetric in fresh interpreters.")
+    parser.add_argument("--repeat", default=5, type=int, help="Number of runs per statement (default: %(default)s)")
+    parser.add_argument("--output", default=None, help="CSV file to store the results")
+    parser.add_argument("--compare", default=None, help="CSV file of baseline results to check for regressions")
+    parser.add_argument(
+        "--threshold",
+        default=1.5,
+        type=float,
+        help="Slowdown factor against the baseline reported as regression (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    records = []
+    failed = False
+    for statement in STATEMENTS:
+        seconds, modules = measure(statement, args.repeat)
+        records.append({"statement": statement, "time_s": seconds, "heavy_modules": " ".join(modules)})
+        print(f"{statement:<48}{seconds:>10.4f}s  {', '.join(modules)}")
+        # the public API shall not load heavy dependencies on import
+        if "mobmetric" in statement and len(modules):
+            print(f"Regression: '{statement}' imports {', '.join(modules)}")
+            failed = True
+
+    results = pd.DataFrame(records)
+    if args.output is not None:
+        log_dir = os.path.dirname(args.output)
+        if log_dir and not os.path.exists(log_dir):
+            os.makedirs(log_dir, exist_ok=True)
+        results.to_csv(args.output, index=False)
+
+    if args.compare is not None:
+        merged = results.merge(pd.read_csv(args.compare), on="statement", suffixes=("", "_baseline"))
+        # imports below 50 ms are within the noise of interpreter start-up
+        merged["ratio"] = merged["time_s"] / merged["time_s_baseline"].clip(lower=0.05)
+        for _, row in merged.loc[merged["ratio"] > args.threshold].iterrows():
+            print(
+                f"Regression: '{row['statement']}' takes {row['time_s']:.4f}s "
+                f"({row['ratio']:.2f}x of {row['time_s_baseline']:.4f}s)"
+            )
+            failed = True
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,227 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+import mobmetric
+from mobmetric import (
+    random_entropy,
+    uncorrelated_entropy,
+    real_entropy,
+    update_entropy_states,
+    radius_gyration,
+    gyration_moments,
+    merge_gyration_moments,
+    radius_gyration_from_moments,
+    jump_length,
+    wait_time,
+    location_frquency,
+    mobility_motifs,
+    motif_catalogue,
+    read_staypoints,
+    iter_staypoints,
+    write_results,
+    compute_metrics,
+    iter_compute_metrics,
+    relative_to_absolute_time,
+    set_backend,
+    get_backend,
+    VisitMatrix,
+    jump_length_histogram,
+    wait_time_histogram,
+    merge_histograms,
+    fit_distributions,
+)
+
+from benchmarks.synthetic import generate_staypoints
+
+
+def get_benchmarks(n_jobs):
+    """
+    Benchmarks of the public functions.
+
+    Each benchmark is a pair (setup, run): setup(context) prepares the arguments outside of the measurement, and
+    run(*arguments) is measured. The context contains the staypoints "sp" and the path "parquet" of a Parquet copy.
+    """
+
+    def _sp(context):
+        return (context["sp"],)
+
+    def _relative(context):
+        return (context["sp"].drop(columns=["started_at", "finished_at", "geometry"]),)
+
+    def _halves(sp):
+        half = sp["user_id"] < sp["user_id"].max() / 2
+        return [sp.loc[half], sp.loc[~half]]
+
+    def _moments(context):
+        return ([gyration_moments(part) for part in _halves(context["sp"])],)
+
+    def _output(context):
+        return (compute_metrics(context["sp"], metrics=["random", "rg"]), context["output"])
+
+    return {
+        "random_entropy": (_sp, lambda sp: random_entropy(sp)),
+        "uncorrelated_entropy": (_sp, lambda sp: uncorrelated_entropy(sp)),
+        "uncorrelated_entropy_duration": (_sp, lambda sp: uncorrelated_entropy(sp, method="duration")),
+        "real_entropy": (_sp, lambda sp: real_entropy(sp, n_jobs=n_jobs)),
+        "update_entropy_states": (_sp, lambda sp: update_entropy_states({}, sp)),
+        "radius_gyration": (_sp, lambda sp: radius_gyration(sp)),
+        "radius_gyration_duration": (_sp, lambda sp: radius_gyration(sp, method="duration")),
+        "gyration_moments": (_sp, lambda sp: gyration_moments(sp)),
+        "merge_gyration_moments": (
+            _moments,
+            lambda moments_ls: radius_gyration_from_moments(merge_gyration_moments(moments_ls)),
+        ),
+        "jump_length": (_sp, lambda sp: jump_length(sp)),
+        "jump_length_by_day": (_sp, lambda sp: jump_length(sp, by_day=True)),
+        "wait_time": (_sp, lambda sp: wait_time(sp)),
+        "jump_length_histogram": (_sp, lambda sp: jump_length_histogram(sp)),
+        "wait_time_histogram": (_sp, lambda sp: wait_time_histogram(sp)),
+        "merge_histograms": (
+            lambda context: ([jump_length_histogram(part) for part in _halves(context["sp"])],),
+            lambda hists: merge_histograms(hists),
+        ),
+        "fit_distributions": (
+            lambda context: (jump_length_histogram(context["sp"]),),
+            lambda hist: fit_distributions(hist, xmin=1),
+        ),
+        "location_frquency": (_sp, lambda sp: location_frquency(sp)),
+        "visit_matrix": (_sp, lambda sp: VisitMatrix.from_staypoints(sp, coordinates=True)),
+        "k_radius_gyration": (
+            lambda context: (VisitMatrix.from_staypoints(context["sp"], coordinates=True),),
+            lambda visit_matrix: visit_matrix.radius_gyration(k=2),
+        ),
+        "mobility_motifs": (_sp, lambda sp: mobility_motifs(sp)),
+        "mobility_motifs_relative": (_relative, lambda sp: mobility_motifs(sp)),
+        "motif_catalogue": (lambda context: (), lambda: motif_catalogue()),
+        "compute_metrics": (_sp, lambda sp: compute_metrics(sp, n_jobs=n_jobs)),
+        "relative_to_absolute_time": (_relative, lambda sp: relative_to_absolute_time(sp)),
+        "read_staypoints": (lambda context: (context["parquet"],), lambda path: read_staypoints(path)),
+        "iter_compute_metrics": (
+            lambda context: (context["parquet"],),
+            lambda path: list(
+                iter_compute_metrics(iter_staypoints(path, chunksize=100000), metrics=["random", "rg"], n_jobs=n_jobs)
+            ),
+        ),
+        "write_results": (_output, lambda result, path: write_results([result], path)),
+    }
+
+
+def measure(run, arguments, repeat):
+    """
+    Measure the wall time (minimum over repeat runs) and the peak memory (separate run traced with tracemalloc).
+
+    The traced run is executed first and also serves as warm-up, e.g., for loading compiled kernels. Memory allocated
+    by worker processes (e.g., real_entropy with n_jobs != 1) is not traced.
+    """
+    tracemalloc.start()
+    run(*arguments)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(*arguments)
+        times.append(time.perf_counter() - start)
+
+    return min(times), peak / 1024**2
+
+
+def compare(results, baseline_path, threshold):
+    """Report benchmarks that are slower than the baseline by more than the threshold factor."""
+    baseline = pd.read_csv(baseline_path)
+    merged = results.merge(baseline, on=["benchmark", "n_users"], suffixes=("", "_baseline"))
+    merged["ratio"] = merged["time_s"] / merged["time_s_baseline"]
+    regressions = merged.loc[merged["ratio"] > threshold]
+    for _, row in regressions.iterrows():
+        print(
+            f"Regression: {row['benchmark']} with {row['n_users']} users takes {row['time_s']:.4f}s "
+            f"({row['ratio']:.2f}x of {row['time_s_baseline']:.4f}s)"
+        )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--users",
+        default=[100, 1000, 10000],
+        type=int,
+        nargs="+",
+        help="Number of users of each scale (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--benchmarks",
+        default=None,
+        nargs="+",
+        help="Benchmarks to run (default: all)",
+    )
+    parser.add_argument("--repeat", default=3, type=int, help="Number of timed runs (default: %(default)s)")
+    parser.add_argument("--seed", default=0, type=int, help="Seed of the synthetic data (default: %(default)s)")
+    parser.add_argument("--n-jobs", default=1, type=int, help="Number of parallel jobs (default: %(default)s)")
+    parser.add_argument(
+        "--backend",
+        default=None,
+        choices=["numba", "numpy"],
+        help="Backend of the per-user inner loops (default: numba if installed)",
+    )
+    parser.add_argument("--output", default=None, help="CSV file to store the results")
+    parser.add_argument("--compare", default=None, help="CSV file of baseline results to check for regressions")
+    parser.add_argument(
+        "--threshold",
+        default=1.2,
+        type=float,
+        help="Slowdown factor against the baseline reported as regression (default: %(default)s)",
+    )
+    args = parser.parse_args()
+    if args.backend is not None:
+        set_backend(args.backend)
+
+    benchmarks = get_benchmarks(args.n_jobs)
+    names = list(benchmarks) if args.benchmarks is None else args.benchmarks
+    unknown = [name for name in names if name not in benchmarks]
+    if len(unknown):
+        raise AttributeError(f"Benchmark unknown. We only support {', '.join(benchmarks)}. You passed {unknown}")
+
+    records = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_users in args.users:
+            sp = generate_staypoints(n_users, seed=args.seed)
+            context = {
+                "sp": sp,
+                "parquet": os.path.join(tmp_dir, f"sp_{n_users}.parquet"),
+                "output": os.path.join(tmp_dir, f"result_{n_users}.parquet"),
+            }
+            sp.to_parquet(context["parquet"])
+
+            for name in names:
+                setup, run = benchmarks[name]
+                time_s, peak_mb = measure(run, setup(context), args.repeat)
+                records.append(
+                    {
+                        "benchmark": name,
+                        "n_users": n_users,
+                        "n_staypoints": len(sp),
+                        "time_s": time_s,
+                        "peak_mb": peak_mb,
+                        "version": mobmetric.__version__,
+                        "backend": get_backend(),
+                    }
+                )
+                print(f"{name:<32}{n_users:>8} users{len(sp):>10} sp{time_s:>10.4f}s{peak_mb:>10.1f}MB")
+
+    results = pd.DataFrame(records)
+    if args.output is not None:
+        log_dir = os.path.dirname(args.output)
+        if log_dir and not os.path.exists(log_dir):
+            os.makedirs(log_dir, exist_ok=True)
+        results.to_csv(args.output, index=False)
+
+    if args.compare is not None and len(compare(results, args.compare, args.threshold)):
+        sys.exit(1)
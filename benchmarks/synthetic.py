@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+# degree of latitude in km
+KM_PER_DEGREE = 111.32
+
+
+def generate_staypoints(
+    n_users,
+    mean_visits=200,
+    zipf_exponent=1.2,
+    mean_duration=3.0,
+    center=(8.54, 47.37),
+    start_time="2023-01-01 08:00:00",
+    seed=0,
+):
+    """
+    Generate synthetic staypoints with realistic mobility statistics for benchmarking.
+
+    The generator is deterministic for a given seed and is fully vectorized, such that millions of staypoints can be
+    generated in seconds:
+    - The number of staypoints per user is heavy-tailed (lognormal with sigma 1, at least 2 staypoints).
+    - The number of locations of a user grows sublinearly with the number of staypoints (Heaps' law, exponent 0.6).
+    - Locations are visited by preference, the visit probability of the location with rank r is proportional to
+      r^(-zipf_exponent) (Zipf's law).
+    - Locations are scattered around the home location of the user with heavy-tailed (lognormal) distances, and homes
+      are scattered around the center.
+    - Durations are lognormal, and staypoints are separated by exponential travel times.
+
+    Parameters
+    ----------
+    n_users : int
+        Number of users.
+
+    mean_visits: float, default 200
+        Mean number of staypoints per user.
+
+    zipf_exponent: float, default 1.2
+        Exponent of the location preference.
+
+    mean_duration: float, default 3.0
+        Mean staypoint duration in hours.
+
+    center: tuple, default (8.54, 47.37)
+        Longitude and latitude around which the users live.
+
+    start_time: str or datetime, default "2023-01-01 08:00:00"
+        Start time of the first staypoint of each user (UTC).
+
+    seed: int, default 0
+        Seed of the random generator.
+
+    Returns
+    -------
+    Geodataframe
+        Staypoints ordered by user and time, with columns "user_id", "location_id", "started_at", "finished_at",
+        "duration" (in hours) and point geometry (EPSG:4326).
+
+    """
+    rng = np.random.default_rng(seed)
+
+    # heavy-tailed trace lengths
+    sigma = 1.0
+    n_visits = rng.lognormal(np.log(mean_visits) - sigma**2 / 2, sigma, size=n_users).astype(np.int64)
+    n_visits = np.maximum(n_visits, 2)
+    n_locs = np.maximum(np.ceil(n_visits**0.6), 2).astype(np.int64)
+    user_codes = np.repeat(np.arange(n_users), n_visits)
+
+    # Zipf location preference, the ranks of user k are drawn from the first n_locs[k] entries of a shared cumulative
+    # weight table
+    cum_weights = np.cumsum(np.arange(1, n_locs.max() + 1, dtype=np.float64) ** -zipf_exponent)
+    draws = rng.random(len(user_codes)) * cum_weights[n_locs[user_codes] - 1]
+    ranks = np.searchsorted(cum_weights, draws, side="right")
+
+    # location ids are unique per user
+    loc_offsets = np.cumsum(n_locs) - n_locs
+    location_ids = loc_offsets[user_codes] + ranks
+
+    # location geometry around the home (rank 0) of each user
+    n_all_locs = n_locs.sum()
+    loc_users = np.repeat(np.arange(n_users), n_locs)
+    home_x = rng.normal(center[0], 0.2, size=n_users)
+    home_y = rng.normal(center[1], 0.1, size=n_users)
+    distances = rng.lognormal(np.log(2.0), 1.0, size=n_all_locs) / KM_PER_DEGREE
+    distances[loc_offsets] = 0
+    angles = rng.uniform(0, 2 * np.pi, size=n_all_locs)
+    loc_x = home_x[loc_users] + distances * np.cos(angles) / np.cos(np.radians(center[1]))
+    loc_y = home_y[loc_users] + distances * np.sin(angles)
+
+    # durations and travel times in hours
+    durations = rng.lognormal(np.log(mean_duration) - 0.5, 1.0, size=len(user_codes))
+    travel = rng.exponential(0.5, size=len(user_codes))
+    ends = pd.Series(durations + travel).groupby(user_codes).cumsum().values - travel
+    starts = ends - durations
+    start_time = pd.Timestamp(start_time, tz="UTC")
+
+    sp = pd.DataFrame(
+        {
+            "user_id": user_codes,
+            "location_id": location_ids,
+            "started_at": start_time + pd.to_timedelta(starts, unit="h"),
+            "finished_at": start_time + pd.to_timedelta(ends, unit="h"),
+            "duration": durations,
+        }
+    )
+    sp.index.name = "id"
+    geometry = gpd.points_from_xy(loc_x[location_ids], loc_y[location_ids])
+    return gpd.GeoDataFrame(sp, geometry=geometry, crs="EPSG:4326")
@@ -1,17 +1,85 @@
-from mobmetric.entropy import random_entropy, uncorrelated_entropy, real_entropy
-from mobmetric.metrics import radius_gyration, jump_length, location_frquency, wait_time
-from mobmetric.motifs import mobility_motifs
+import importlib
 
 __version__ = "0.1.0"
 
+# public names and their modules, imported on first access (PEP 562) such that "import mobmetric" does not load the
+# heavy dependencies (trackintel, geopandas, networkx, joblib, numba) of functions that are not used
+_LAZY_ATTRIBUTES = {
+    "random_entropy": "entropy",
+    "uncorrelated_entropy": "entropy",
+    "real_entropy": "entropy",
+    "EntropyState": "entropy",
+    "update_entropy_states": "entropy",
+    "radius_gyration": "metrics",
+    "gyration_moments": "metrics",
+    "merge_gyration_moments": "metrics",
+    "radius_gyration_from_moments": "metrics",
+    "jump_length": "metrics",
+    "location_frquency": "metrics",
+    "wait_time": "metrics",
+    "jump_length_histogram": "metrics",
+    "wait_time_histogram": "metrics",
+    "mobility_motifs": "motifs",
+    "motif_catalogue": "motifs",
+    "read_staypoints": "io",
+    "iter_staypoints": "io",
+    "write_results": "io",
+    "compute_metrics": "compute",
+    "iter_compute_metrics": "compute",
+    "relative_to_absolute_time": "utils",
+    "profile": "profiling",
+    "set_backend": "kernels",
+    "get_backend": "kernels",
+    "ResultCache": "cache",
+    "VisitMatrix": "visits",
+    "LogHistogram": "distributions",
+    "merge_histograms": "distributions",
+    "fit_distributions": "distributions",
+}
+
 __all__ = [
     "random_entropy",
     "uncorrelated_entropy",
     "real_entropy",
+    "EntropyState",
+    "update_entropy_states",
     "location_frquency",
     "radius_gyration",
+    "gyration_moments",
+    "merge_gyration_moments",
+    "radius_gyration_from_moments",
     "jump_length",
     "location_frquency",
     "wait_time",
+    "jump_length_histogram",
+    "wait_time_histogram",
     "mobility_motifs",
+    "motif_catalogue",
+    "read_staypoints",
+    "iter_staypoints",
+    "write_results",
+    "compute_metrics",
+    "iter_compute_metrics",
+    "relative_to_absolute_time",
+    "profile",
+    "set_backend",
+    "get_backend",
+    "ResultCache",
+    "VisitMatrix",
+    "LogHistogram",
+    "merge_histograms",
+    "fit_distributions",
 ]
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(f"mobmetric.{_LAZY_ATTRIBUTES[name]}"), name)
+        # cache the attribute, later accesses do not call __getattr__
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module 'mobmetric' has no attribute '{name}'")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -0,0 +1,158 @@
+# compiled kernels of mobmetric.kernels, imported on first use such that numba is not loaded by "import mobmetric"
+import math
+
+import numpy as np
+from numba import njit, prange
+
+
+@njit(cache=True)
+def _hash_find(keys, key, shift, mask):
+    """Slot of key in the open addressing hash table, or the empty slot where it shall be inserted."""
+    slot = np.int64((np.uint64(key) * np.uint64(11400714819323198485)) >> np.uint64(shift))
+    while keys[slot] != -1 and keys[slot] != key:
+        slot = (slot + 1) & mask
+    return slot
+
+
+@njit(cache=True)
+def _lambda_sum_kernel(locs, n_symbols):
+    """
+    Compiled version of _RealEntropyState for a complete sequence.
+
+    The transitions of the suffix automaton are stored in an open addressing hash table keyed by
+    state * n_symbols + symbol, and additionally as a linked list per state to copy them when a state is cloned.
+    """
+    n = len(locs)
+    if n < 3:
+        return 1
+
+    # states and transitions of the suffix automaton of at most n elements
+    max_states = 2 * n
+    max_edges = 3 * n + 1
+    length = np.zeros(max_states, dtype=np.int64)
+    link = np.full(max_states, -1, dtype=np.int64)
+    head = np.full(max_states, -1, dtype=np.int64)
+    edge_slot = np.empty(max_edges, dtype=np.int64)
+    edge_next = np.empty(max_edges, dtype=np.int64)
+    bits = 1
+    while (1 << bits) < 2 * max_edges:
+        bits += 1
+    mask = (1 << bits) - 1
+    shift = 64 - bits
+    keys = np.full(1 << bits, -1, dtype=np.int64)
+    targets = np.empty(1 << bits, dtype=np.int64)
+    n_states, n_edges, last = 1, 0, 0
+
+    position, state, match = 0, 0, 0
+    closed_sum = 1
+    while True:
+        # add locs[position] to the automaton (the first element before the search)
+        c = locs[position]
+        cur = n_states
+        n_states += 1
+        length[cur] = length[last] + 1
+        link[cur] = 0
+        split_state, clone = -1, -1
+
+        p = last
+        while p != -1:
+            slot = _hash_find(keys, p * n_symbols + c, shift, mask)
+            if keys[slot] != -1:
+                break
+            keys[slot] = p * n_symbols + c
+            targets[slot] = cur
+            edge_slot[n_edges] = slot
+            edge_next[n_edges] = head[p]
+            head[p] = n_edges
+            n_edges += 1
+            p = link[p]
+        last = cur
+
+        if p != -1:
+            q = targets[_hash_find(keys, p * n_symbols + c, shift, mask)]
+            if length[p] + 1 == length[q]:
+                link[cur] = q
+            else:
+                clone = n_states
+                n_states += 1
+                length[clone] = length[p] + 1
+                link[clone] = link[q]
+                # copy the transitions of q
+                edge = head[q]
+                while edge != -1:
+                    key = keys[edge_slot[edge]] - q * n_symbols + clone * n_symbols
+                    slot = _hash_find(keys, key, shift, mask)
+                    keys[slot] = key
+                    targets[slot] = targets[edge_slot[edge]]
+                    edge_slot[n_edges] = slot
+                    edge_next[n_edges] = head[clone]
+                    head[clone] = n_edges
+                    n_edges += 1
+                    edge = edge_next[edge]
+                while p != -1:
+                    slot = _hash_find(keys, p * n_symbols + c, shift, mask)
+                    if keys[slot] == -1 or targets[slot] != q:
+                        break
+                    targets[slot] = clone
+                    p = link[p]
+                link[q] = clone
+                link[cur] = clone
+                split_state = q
+
+        if position > 0:
+            # the state of the match is split if a clone is created
+            if state == split_state and match <= length[clone]:
+                state = clone
+        position += 1
+        if position >= n - 1:
+            break
+
+        # extend the match as far as possible in locs[:position]
+        while position + match < n:
+            slot = _hash_find(keys, state * n_symbols + locs[position + match], shift, mask)
+            if keys[slot] == -1:
+                break
+            state = targets[slot]
+            match += 1
+
+        # the match reaches the end of the sequence, the remaining positions are open
+        if position + match == n:
+            break
+
+        # length of the "shortest substring" that does not exist in locs[:position]
+        closed_sum += match + 1
+
+        # drop the first element of the match for position + 1
+        if match > 0:
+            match -= 1
+            if match <= length[link[state]]:
+                state = link[state]
+
+    # open positions i in [position, n - 2] have the lambda n - i + 1, i.e., from n - position + 1 down to 3
+    longest = n - position + 1
+    if longest < 3:
+        return closed_sum
+    return closed_sum + (longest + 3) * (longest - 2) // 2
+
+
+@njit(parallel=True, cache=True)
+def _lambda_sums_kernel(loc_codes, offsets, users, n_symbols):
+    """Lambda sum of each user in parallel, see kernels.lambda_sums()."""
+    sums = np.empty(len(users), dtype=np.int64)
+    for i in prange(len(users)):
+        k = users[i]
+        sums[k] = _lambda_sum_kernel(loc_codes[offsets[k] : offsets[k + 1]], n_symbols)
+    return sums
+
+
+@njit(parallel=True, cache=True)
+def _haversine_kernel(lon_1, lat_1, lon_2, lat_2, r):
+    """Element-wise haversine distances in parallel, see kernels.haversine_dist()."""
+    dists = np.empty(len(lon_1), dtype=np.float64)
+    for i in prange(len(lon_1)):
+        lat_1_rad = math.radians(lat_1[i])
+        lat_2_rad = math.radians(lat_2[i])
+        cos_lat_d = math.cos(lat_1_rad - lat_2_rad)
+        cos_lon_d = math.cos(math.radians(lon_1[i]) - math.radians(lon_2[i]))
+        dists[i] = r * math.acos(cos_lat_d - math.cos(lat_1_rad) * math.cos(lat_2_rad) * (1 - cos_lon_d))
+    return dists
@@ -0,0 +1,290 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from mobmetric.utils import _is_geodataframe, user_segments
+
+# functions with independent per-user results, unchanged users are reused and only changed users are recomputed
+PER_USER_FUNCTIONS = ["random_entropy", "uncorrelated_entropy", "real_entropy", "radius_gyration", "compute_metrics"]
+
+# parameters that do not change the result
+IGNORED_PARAMETERS = ["print_progress", "n_jobs"]
+
+# multiplier of the polynomial per-user fingerprint (odd, such that the powers do not vanish modulo 2^64)
+FINGERPRINT_BASE = np.uint64(1099511628211)
+
+
+class ResultCache:
+    """
+    Persistent on-disk cache of metric results in Parquet files.
+
+    Results are keyed by the function name, its parameters (excluding print_progress and n_jobs) and the mobmetric
+    version. The input is fingerprinted per user with a content hash of all staypoint columns in their order:
+    - Functions with per-user results (random_entropy(), uncorrelated_entropy(), real_entropy(), radius_gyration()
+      and compute_metrics()) store one row per user with its fingerprint. On a later call, the results of unchanged
+      users are reused, and only new or changed users are computed.
+    - Other functions (e.g., mobility_motifs(), whose motif filter depends on all users) are cached for the whole
+      dataset, keyed by the fingerprint of all users.
+
+    The least recently used files are evicted once the cache exceeds max_size.
+
+    Parameters
+    ----------
+    cache_dir: str, default None
+        Directory of the cache. Defaults to the environment variable MOBMETRIC_CACHE_DIR, or ~/.cache/mobmetric.
+
+    max_size: int, default 1073741824
+        Maximum total size of the cache files in bytes (1 GB).
+
+    Examples
+    --------
+    >>> cache = ResultCache()
+    >>> rg = cache.compute(radius_gyration, sp, method="duration")
+
+    """
+
+    def __init__(self, cache_dir=None, max_size=2**30):
+        if cache_dir is None:
+            cache_dir = os.environ.get("MOBMETRIC_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mobmetric"))
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def compute(self, func, sp, **params):
+        """
+        Return the cached result of func(sp, **params), computing and storing it if required.
+
+        Parameters
+        ----------
+        func : callable
+            A mobmetric function, e.g., real_entropy.
+
+        sp : Geodataframe or DataFrame
+            Staypoints passed to func.
+
+        **params
+            Further arguments passed to func, part of the cache key.
+
+        Returns
+        -------
+        pandas Series, DataFrame or np.array
+            The result of func. Results of other types (e.g., tuples) are computed but not cached.
+
+        """
+        from mobmetric import __version__
+
+        key = {
+            "function": func.__name__,
+            "params": {name: value for name, value in params.items() if name not in IGNORED_PARAMETERS},
+            "version": __version__,
+        }
+        users, fingerprints = user_fingerprints(sp)
+
+        if func.__name__ in PER_USER_FUNCTIONS:
+            return self._compute_per_user(func, sp, params, key, users, fingerprints)
+
+        # the dataset fingerprint combines the user ids and fingerprints
+        key["dataset"] = hashlib.sha1(
+            pd.util.hash_pandas_object(pd.Series(users), index=False).values.tobytes() + fingerprints.tobytes()
+        ).hexdigest()
+        path = self._get_path(key)
+        if os.path.exists(path):
+            return self._read(path)[0]
+
+        result = func(sp, **params)
+        if isinstance(result, (pd.Series, pd.DataFrame, np.ndarray)):
+            self._write(result, path)
+        return result
+
+    def size(self):
+        """
+        Total size of the cache files.
+
+        Returns
+        -------
+        int
+            The size in bytes.
+
+        """
+        return sum(os.path.getsize(path) for path in self._get_files())
+
+    def clear(self):
+        """Delete all cache files."""
+        for path in self._get_files():
+            os.remove(path)
+
+    def _compute_per_user(self, func, sp, params, key, users, fingerprints):
+        """Reuse the results of unchanged users and compute the others, see compute()."""
+        path = self._get_path(key)
+        cached, name = self._read(path) if os.path.exists(path) else (None, None)
+
+        # users with a cached result of the same fingerprint
+        if cached is not None:
+            positions = cached.index.get_indexer(users)
+            is_hit = positions >= 0
+            is_hit[is_hit] = cached["_fingerprint"].values[positions[is_hit]] == fingerprints[is_hit].view(np.int64)
+        else:
+            is_hit = np.zeros(len(users), dtype=bool)
+
+        if is_hit.all():
+            result = cached.iloc[positions]
+        else:
+            changed = sp.loc[np.asarray(sp["user_id"].isin(users[~is_hit]))]
+            computed = func(changed, **params)
+            name = computed.name if isinstance(computed, pd.Series) else None
+            computed = computed.to_frame() if isinstance(computed, pd.Series) else computed
+            computed = computed.reindex(users[~is_hit])
+            computed["_fingerprint"] = fingerprints[~is_hit].view(np.int64)
+
+            if cached is None:
+                updated = computed
+                result = computed
+            else:
+                result = pd.concat([cached.iloc[positions[is_hit]], computed]).reindex(users)
+                # keep the cached users of other datasets
+                updated = pd.concat([cached.loc[~cached.index.isin(users[~is_hit])], computed])
+            self._write(updated, path, name=name)
+
+        result = result.drop(columns="_fingerprint")
+        result.index.name = "user_id"
+        if name is not None:
+            return result[name]
+        return result
+
+    def _get_path(self, key):
+        """Cache file of a key."""
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key['function']}_{digest}.parquet")
+
+    def _get_files(self):
+        """Paths of the cache files."""
+        return [
+            os.path.join(self.cache_dir, file) for file in os.listdir(self.cache_dir) if file.endswith(".parquet")
+        ]
+
+    def _read(self, path):
+        """Read a cache file and mark it as recently used. Returns the result and the Series name (if any)."""
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path)
+        metadata = json.loads(table.schema.metadata[b"mobmetric"])
+        os.utime(path)
+
+        df = table.to_pandas()
+        if metadata["kind"] == "series":
+            return df[metadata["name"]], None
+        if metadata["kind"] == "array":
+            return df["value"].values, None
+        return df, metadata["name"]
+
+    def _write(self, result, path, name=None):
+        """Write a result to a cache file and evict the least recently used files."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if isinstance(result, np.ndarray):
+            metadata = {"kind": "array", "name": None}
+            df = pd.DataFrame({"value": result})
+        elif isinstance(result, pd.Series):
+            metadata = {"kind": "series", "name": result.name}
+            df = result.to_frame()
+        else:
+            metadata = {"kind": "frame", "name": name}
+            df = pd.DataFrame(result)
+
+        table = pa.Table.from_pandas(df)
+        table = table.replace_schema_metadata({**table.schema.metadata, b"mobmetric": json.dumps(metadata)})
+        # write to a temporary file first, such that concurrent readers never see partial files
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+        self._evict(keep=path)
+
+    def _evict(self, keep=None):
+        """Delete the least recently used files until the cache fits into max_size."""
+        files = sorted(self._get_files(), key=os.path.getmtime)
+        total = sum(os.path.getsize(path) for path in files)
+        for path in files:
+            if total <= self.max_size:
+                break
+            if path == keep:
+                continue
+            total -= os.path.getsize(path)
+            os.remove(path)
+
+
+def get_compute(cache_dir=None):
+    """
+    Compute function of the scripts, cached in cache_dir if given.
+
+    Parameters
+    ----------
+    cache_dir: str, default None
+        Directory of the result cache. Results are not cached if None.
+
+    Returns
+    -------
+    callable
+        ResultCache(cache_dir).compute, or a function with the same signature that calls func(sp, **params).
+
+    """
+    if cache_dir is None:
+        return _compute
+    return ResultCache(cache_dir).compute
+
+
+def _compute(func, sp, **params):
+    """Uncached func(sp, **params), see get_compute()."""
+    return func(sp, **params)
+
+
+def user_fingerprints(sp):
+    """
+    Content fingerprint of the staypoints of each user.
+
+    Each staypoint is hashed over all its columns (point geometry as coordinates, other geometry as WKB), and the hashes of a user are combined in their
+    order with a polynomial hash, such that any change of values, order or number of staypoints changes the
+    fingerprint.
+
+    Parameters
+    ----------
+    sp : Geodataframe or DataFrame
+        Staypoints with column "user_id".
+
+    Returns
+    -------
+    pandas Index
+        The "user_id" of each user, sorted as in groupby.
+
+    np.array
+        The uint64 fingerprint of each user.
+
+    """
+    df = pd.DataFrame(sp)
+    if _is_geodataframe(sp):
+        import geopandas as gpd
+
+        geometry = df.pop(sp.geometry.name)
+        if (sp.geom_type == "Point").all():
+            # cheaper than WKB for the common case of point staypoints
+            df["_x"], df["_y"] = sp.geometry.x.values, sp.geometry.y.values
+        else:
+            df["_wkb"] = gpd.GeoSeries(geometry).to_wkb()
+    row_hashes = pd.util.hash_pandas_object(df, index=False).values
+
+    order, offsets, users = user_segments(sp["user_id"])
+    lengths = np.diff(offsets)
+    if not len(users):
+        return users, np.zeros(0, dtype=np.uint64)
+
+    # position of each staypoint within its user, and the powers of the base
+    positions = np.arange(len(order)) - np.repeat(offsets[:-1], lengths)
+    powers = np.cumprod(np.full(lengths.max(), FINGERPRINT_BASE, dtype=np.uint64))
+    with np.errstate(over="ignore"):
+        terms = row_hashes[order] * powers[positions]
+        fingerprints = np.add.reduceat(terms, offsets[:-1]) ^ lengths.astype(np.uint64)
+    return users, fingerprints
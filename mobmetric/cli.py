@@ -0,0 +1,500 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+# metrics of the run step: per-user metrics of compute_metrics(), distributions and motifs
+METRICS = ["random", "uncorrelated", "real", "rg", "jump", "wait", "locf", "motifs"]
+
+# lower bound of the distribution fits: radius of gyration in km, jump length in m, wait time in hours
+DISTRIBUTIONS = {"rg": 1, "jump": 1, "wait": 0.1}
+
+ENTROPY_COLUMNS = {"random": "randomEntropy", "uncorrelated": "uncorrelatedEntropy", "real": "realEntropy"}
+
+
+def main(argv=None):
+    """
+    Entry point of the mobmetric command.
+
+    "mobmetric run" computes the metrics of several datasets in a process pool and writes the results as Parquet files
+    to <output-dir>/<dataset>/. "mobmetric plot" renders the figures of stored results in a separate step.
+
+    Parameters
+    ----------
+    argv : list, default None
+        Command line arguments, sys.argv[1:] if None.
+
+    Returns
+    -------
+    int
+        The exit code, 1 if a task failed.
+
+    """
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 1
+    if args.command == "run":
+        return run(args)
+    return plot(args)
+
+
+def get_parser():
+    """Command line parser of main()."""
+    parser = argparse.ArgumentParser(prog="mobmetric", description="Individual mobility metrics.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser("run", help="Compute metrics of datasets and write the results as Parquet")
+    run_parser.add_argument(
+        "datasets",
+        nargs="+",
+        help="Datasets, either names of <input-dir>/<dataset>.<format> or paths to files",
+    )
+    run_parser.add_argument(
+        "--metrics",
+        default=METRICS,
+        nargs="+",
+        choices=METRICS,
+        help="Metrics to compute (default: all)",
+    )
+    run_parser.add_argument(
+        "--input-dir", default=os.path.join("data", "input"), help="Input folder (default: %(default)s)"
+    )
+    run_parser.add_argument(
+        "--output-dir", default=os.path.join("data", "output"), help="Output folder (default: %(default)s)"
+    )
+    run_parser.add_argument(
+        "--format",
+        default="csv",
+        choices=["csv", "parquet", "feather"],
+        help="File format of the input datasets (default: %(default)s)",
+    )
+    run_parser.add_argument("--index-col", default=None, help="Index column of the input datasets, e.g., 'index'")
+    run_parser.add_argument(
+        "--method",
+        default="count",
+        choices=["duration", "count"],
+        help="Method for calculating radius of gyration (default: %(default)s)",
+    )
+    run_parser.add_argument(
+        "--proportion-filter",
+        default=0.005,
+        type=float,
+        help="Proportion filter for considering day graphs as motifs (default: %(default)s)",
+    )
+    run_parser.add_argument(
+        "--time-format",
+        default="relative",
+        choices=["absolute", "relative"],
+        help="Time from 'started_at' and 'finished_at' (parsed as UTC datetimes), or from 'duration' "
+        "(default: %(default)s)",
+    )
+    run_parser.add_argument(
+        "--processes",
+        default=os.cpu_count(),
+        type=int,
+        help="Number of worker processes, tasks run in the main process if 1 (default: number of CPUs)",
+    )
+    run_parser.add_argument(
+        "--n-jobs", default=1, type=int, help="Number of parallel jobs of real entropy per task (default: %(default)s)"
+    )
+    run_parser.add_argument(
+        "--cache",
+        default=None,
+        help="Directory of the result cache, results are reused for unchanged inputs (default: no cache)",
+    )
+    run_parser.add_argument("--plot", action="store_true", help="Render the figures after the computation")
+    _add_plot_arguments(run_parser)
+
+    plot_parser = subparsers.add_parser("plot", help="Render the figures of results written by 'mobmetric run'")
+    plot_parser.add_argument("datasets", nargs="+", help="Dataset names, i.e., folders of <output-dir>")
+    plot_parser.add_argument(
+        "--output-dir", default=os.path.join("data", "output"), help="Output folder (default: %(default)s)"
+    )
+    _add_plot_arguments(plot_parser)
+
+    return parser
+
+
+def _add_plot_arguments(parser):
+    parser.add_argument("--dpi", default=150, type=int, help="Resolution of the figures (default: %(default)s)")
+    parser.add_argument(
+        "--figure-format", default="png", help="File format of the figures, e.g., png or pdf (default: %(default)s)"
+    )
+
+
+def run(args):
+    """
+    Compute the metrics of all datasets in a process pool, see main().
+
+    Each dataset is split into independent tasks: the per-user metrics (one compute_metrics() pass, with the radius of
+    gyration distribution and the location visitation frequency), the jump length and wait time distributions, and the
+    motifs. Returns the exit code.
+    """
+    tasks = []
+    for dataset in args.datasets:
+        path, name = _get_dataset_path(dataset, args.input_dir, args.format)
+        for task in _get_tasks(args.metrics):
+            tasks.append((name, task, path))
+
+    options = {
+        "output_dir": args.output_dir,
+        "file_format": args.format,
+        "index_col": args.index_col,
+        "metrics": args.metrics,
+        "method": args.method,
+        "proportion_filter": args.proportion_filter,
+        "time_format": args.time_format,
+        "n_jobs": args.n_jobs,
+        "cache": args.cache,
+    }
+
+    failed = False
+    if args.processes == 1:
+        for name, task, path in tasks:
+            failed |= not _report(name, task, lambda: run_task(name, task, path, options))
+    else:
+        with ProcessPoolExecutor(max_workers=min(args.processes, len(tasks))) as executor:
+            futures = {
+                executor.submit(run_task, name, task, path, options): (name, task) for name, task, path in tasks
+            }
+            for future in as_completed(futures):
+                failed |= not _report(*futures[future], future.result)
+
+    if args.plot:
+        args.datasets = list(dict.fromkeys(name for name, _, _ in tasks))
+        failed |= plot(args) != 0
+    return 1 if failed else 0
+
+
+def _report(name, task, get_result):
+    """Print the outcome of a task, returns False if it failed."""
+    try:
+        paths, seconds = get_result()
+    except Exception as e:
+        print(f"{name} {task}: failed with {type(e).__name__}: {e}", file=sys.stderr)
+        return False
+    print(f"{name} {task}: {seconds:.2f}s, wrote {', '.join(os.path.basename(path) for path in paths)}")
+    return True
+
+
+def _get_dataset_path(dataset, input_dir, file_format):
+    """Path and name of a dataset, given as name of <input_dir>/<dataset>.<file_format> or as path."""
+    if os.path.isfile(dataset):
+        return dataset, os.path.splitext(os.path.basename(dataset))[0]
+    return os.path.join(input_dir, f"{dataset}.{file_format}"), dataset
+
+
+def _get_tasks(metrics):
+    """Independent tasks of the requested metrics."""
+    tasks = []
+    if any(metric in metrics for metric in ["random", "uncorrelated", "real", "rg", "locf"]):
+        tasks.append("users")
+    tasks.extend(metric for metric in ["jump", "wait", "motifs"] if metric in metrics)
+    return tasks
+
+
+def run_task(name, task, path, options):
+    """
+    Compute one task of a dataset and write its results, see run().
+
+    If per-user metrics of the "users" task fail, the results of the other metrics are written before a RuntimeError
+    names the failed metrics.
+
+    Parameters
+    ----------
+    name : str
+        Name of the dataset, the results are written to <output_dir>/<name>/.
+
+    task : string, {"users", "jump", "wait", "motifs"}
+        The task.
+
+    path : str
+        Path to the staypoints.
+
+    options : dict
+        Options of the run command.
+
+    Returns
+    -------
+    list
+        Paths of the written files.
+
+    float
+        Wall time in seconds.
+
+    """
+    from mobmetric.cache import get_compute
+    from mobmetric.io import _get_file_columns, read_staypoints
+
+    start = time.perf_counter()
+    out_dir = os.path.join(options["output_dir"], name)
+    os.makedirs(out_dir, exist_ok=True)
+    # only read (and parse the geometry of) the columns of the task
+    columns, geometry = _get_task_columns(task, options, _get_file_columns(path, options["file_format"]))
+    sp = read_staypoints(
+        path, file_format=options["file_format"], columns=columns, index_col=options["index_col"], geometry=geometry
+    )
+
+    if options["time_format"] == "absolute":
+        # as in the scripts, the times are stored as strings in CSV files
+        sp = sp.assign(
+            **{
+                col: pd.to_datetime(sp[col], format="mixed", yearfirst=True, utc=True)
+                for col in ["started_at", "finished_at"]
+                if col in sp.columns
+            }
+        )
+
+    compute = get_compute(options["cache"])
+
+    results = {}
+    errors = []
+    if task == "users":
+        from mobmetric.compute import compute_metrics, METRICS as USER_METRICS
+
+        metrics = [metric for metric in options["metrics"] if metric in USER_METRICS]
+        params = {"method": options["method"], "n_jobs": options["n_jobs"]}
+        try:
+            users = compute(compute_metrics, sp, metrics=metrics, **params)
+        except Exception:
+            # compute the metrics one by one, such that a failing metric does not discard the others
+            users = []
+            for metric in metrics:
+                try:
+                    users.append(compute(compute_metrics, sp, metrics=[metric], **params))
+                except Exception as e:
+                    errors.append(f"{metric} ({type(e).__name__}: {e})")
+            users = pd.concat(users, axis=1) if len(users) else pd.DataFrame()
+        results["users"] = users
+        if "radiusGyration" in users.columns:
+            # in km
+            results.update(_fit_results("rg", users["radiusGyration"].values / 1000))
+        if "locf" in metrics:
+            from mobmetric.metrics import location_frquency
+
+            loc_freq = compute(location_frquency, sp)
+            results["locf"] = pd.DataFrame({"rank": np.arange(len(loc_freq)) + 1, "frequency": loc_freq})
+
+    elif task == "jump":
+        from mobmetric.metrics import jump_length_histogram
+
+        results.update(_fit_results("jump", jump_length_histogram(sp)))
+
+    elif task == "wait":
+        from mobmetric.metrics import wait_time_histogram
+
+        results.update(_fit_results("wait", wait_time_histogram(sp)))
+
+    elif task == "motifs":
+        from mobmetric.motifs import mobility_motifs
+
+        results["motifs"] = compute(mobility_motifs, sp, proportion_filter=options["proportion_filter"])
+
+    else:
+        raise AttributeError(
+            f"Task unknown. Please check the input arguement. We only support 'users', 'jump', 'wait', 'motifs'. "
+            f"You passed {task}"
+        )
+
+    paths = []
+    for file_name, df in results.items():
+        paths.append(os.path.join(out_dir, f"{file_name}.parquet"))
+        df.to_parquet(paths[-1])
+    if len(errors):
+        raise RuntimeError(f"{', '.join(errors)} failed, wrote {', '.join(os.path.basename(path) for path in paths)}")
+    return paths, time.perf_counter() - start
+
+
+def _get_task_columns(task, options, file_columns):
+    """
+    Columns of the file required by a task, and whether the geometry has to be parsed.
+
+    Coordinates are only read for the radius of gyration and jump length, as "geometry" column or as float columns, and
+    time columns only for the wait time and the motifs.
+    """
+    metrics = options["metrics"]
+    columns = ["user_id"]
+    coordinates = False
+    # wait_time() uses "duration" if available
+    wait_columns = ["duration"] if "duration" in file_columns else ["started_at", "finished_at"]
+    if task == "users":
+        columns += ["location_id", "duration"]
+        coordinates = "rg" in metrics or "jump" in metrics
+        if "wait" in metrics:
+            columns += wait_columns
+    elif task == "jump":
+        coordinates = True
+    elif task == "wait":
+        columns += wait_columns
+    elif task == "motifs":
+        # relative time (duration only) is handled by mobility_motifs()
+        columns.append("location_id")
+        columns += ["duration"] if options["time_format"] == "relative" else ["started_at", "finished_at"]
+    if coordinates:
+        columns += ["geometry", "lat", "lng", "x", "y"]
+
+    columns = [column for column in file_columns if column in columns]
+    return columns, coordinates and "geometry" in columns
+
+
+def _fit_results(metric, values):
+    """Histogram, fitted distributions and their comparison of a metric, as DataFrames to write."""
+    from mobmetric.distributions import LogHistogram, fit_distributions
+
+    hist = values if isinstance(values, LogHistogram) else LogHistogram().update(values)
+    fit = fit_distributions(hist, xmin=DISTRIBUTIONS[metric])
+    return {
+        f"{metric}_histogram": hist.to_frame(),
+        f"{metric}_fit": fit.to_frame(),
+        f"{metric}_comparisons": fit.comparisons,
+    }
+
+
+def plot(args):
+    """
+    Render the figures of the results of each dataset to <output-dir>/<dataset>/figures/, see main().
+
+    Only figures of existing results are rendered. Returns the exit code.
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+    failed = False
+    for name in args.datasets:
+        out_dir = os.path.join(args.output_dir, name)
+        if not os.path.isdir(out_dir):
+            print(f"{name}: no results in {out_dir}", file=sys.stderr)
+            failed = True
+            continue
+        fig_dir = os.path.join(out_dir, "figures")
+        os.makedirs(fig_dir, exist_ok=True)
+
+        figures = []
+        for metric in DISTRIBUTIONS:
+            if os.path.exists(os.path.join(out_dir, f"{metric}_fit.parquet")):
+                figures.append(_plot_distribution(out_dir, fig_dir, metric, args))
+        if os.path.exists(os.path.join(out_dir, "users.parquet")):
+            figures.extend(_plot_entropy(out_dir, fig_dir, args))
+        if os.path.exists(os.path.join(out_dir, "locf.parquet")):
+            figures.append(_plot_location_frequency(out_dir, fig_dir, args))
+        if os.path.exists(os.path.join(out_dir, "motifs.parquet")):
+            figures.extend(_plot_motifs(out_dir, fig_dir, args))
+        print(f"{name}: rendered {', '.join(os.path.basename(path) for path in figures) or 'no figures'}")
+    return 1 if failed else 0
+
+
+def _save_figure(fig_dir, file_name, args):
+    import matplotlib.pyplot as plt
+
+    path = os.path.join(fig_dir, f"{file_name}.{args.figure_format}")
+    plt.savefig(path, bbox_inches="tight", dpi=args.dpi)
+    plt.close()
+    return path
+
+
+def _plot_distribution(out_dir, fig_dir, metric, args):
+    """Binned density and fitted distributions of rg, jump or wait."""
+    import matplotlib.pyplot as plt
+
+    from mobmetric.distributions import LogHistogram, DistributionFit
+
+    hist = LogHistogram.from_frame(pd.read_parquet(os.path.join(out_dir, f"{metric}_histogram.parquet")))
+    fit = DistributionFit.from_frame(pd.read_parquet(os.path.join(out_dir, f"{metric}_fit.parquet")))
+    labels = {
+        "rg": ("$Rg$ (km)", "$P(Rg)$"),
+        "jump": ("$\\Delta r\\,(m)$", "$P(\\Delta r)$"),
+        "wait": ("$\\Delta t\\,(hour)$", "$P(\\Delta t)$"),
+    }
+
+    plt.figure(figsize=(8, 5))
+    centers, pdf = hist.density(fit.xmin)
+    plt.plot(centers, pdf, "o", label="data")
+    x = np.logspace(np.log10(fit.xmin), np.log10(centers.max()), 200)
+    plt.plot(x, fit.pdf("power_law", x), "--", label="powerlaw fit")
+    plt.plot(x, fit.pdf("truncated_power_law", x), "--", label="truncated power law")
+    plt.plot(x, fit.pdf("lognormal", x), "--", label="lognormal fit")
+    plt.yscale("log")
+    plt.xscale("log")
+
+    plt.legend(prop={"size": 13})
+    plt.xlabel(labels[metric][0], fontsize=16)
+    plt.ylabel(labels[metric][1], fontsize=16)
+    return _save_figure(fig_dir, metric, args)
+
+
+def _plot_entropy(out_dir, fig_dir, args):
+    """Densities of the entropies, if computed."""
+    import matplotlib.pyplot as plt
+    import scipy.stats as stats
+
+    users = pd.read_parquet(os.path.join(out_dir, "users.parquet"))
+    columns = [(metric, column) for metric, column in ENTROPY_COLUMNS.items() if column in users.columns]
+    if not columns:
+        return []
+
+    plt.figure(figsize=(8, 5))
+    for metric, column in columns:
+        entropy = users[column].dropna().values
+        density = stats.gaussian_kde(entropy)
+        x = np.linspace(0, np.max(entropy) + 0.2, 100)
+        plt.plot(x, density(x), label=f"{metric.capitalize()} entropy")
+
+    plt.legend(prop={"size": 12})
+    plt.xlabel("Entropy", fontsize=16)
+    plt.ylabel("PDF", fontsize=16)
+    return [_save_figure(fig_dir, "entropy", args)]
+
+
+def _plot_location_frequency(out_dir, fig_dir, args):
+    """Location visitation frequency by rank."""
+    import matplotlib.pyplot as plt
+
+    loc_freq = pd.read_parquet(os.path.join(out_dir, "locf.parquet"))
+    n = loc_freq["rank"].values
+
+    plt.figure(figsize=(8, 5))
+    plt.plot(n, np.power(n, -1.0) / 4, "--", label="$f_k\\sim k^{-1}$", color="k")
+    plt.plot(n, loc_freq["frequency"].values)
+    plt.yscale("log")
+    plt.xscale("log")
+
+    plt.legend(prop={"size": 13})
+    plt.xlabel("$f_k$", fontsize=16)
+    plt.ylabel("$k$", fontsize=16)
+    return _save_figure(fig_dir, "locf", args)
+
+
+def _plot_motifs(out_dir, fig_dir, args):
+    """Motifs proportion across users and the motifs distribution of all user days."""
+    import matplotlib.pyplot as plt
+    import scipy.stats as stats
+
+    motifs = pd.read_parquet(os.path.join(out_dir, "motifs.parquet"), columns=["user_id", "uniq_visits", "class"])
+    paths = []
+
+    # proportion of the days of each user that are motifs
+    proportions = motifs["class"].notna().groupby(motifs["user_id"]).mean().values
+    plt.figure(figsize=(8, 5))
+    x = np.linspace(0, 1, 50)
+    plt.plot(x, stats.gaussian_kde(proportions)(x))
+    plt.xlim([-0.02, 1.02])
+    plt.xlabel("Motifs proportion", fontsize=16)
+    plt.ylabel("PDF", fontsize=16)
+    paths.append(_save_figure(fig_dir, "motifs_proportion", args))
+
+    motifs_frq = motifs.dropna(subset="class").groupby(["uniq_visits", "class"], as_index=False).size()
+    motifs_frq["size"] = motifs_frq["size"] / len(motifs)
+    labels = motifs_frq["uniq_visits"].astype(int).astype(str) + "_" + motifs_frq["class"].astype(int).astype(str)
+    plt.figure(figsize=(8, 5))
+    plt.bar(x=np.arange(len(motifs_frq)), height=motifs_frq["size"], tick_label=labels)
+    plt.xlabel("Motifs", fontsize=16)
+    plt.ylabel("Proportion", fontsize=16)
+    paths.append(_save_figure(fig_dir, "motifs_distribution", args))
+    return paths
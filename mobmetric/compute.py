@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+from mobmetric.entropy import _real_entropy_segments
+from mobmetric.metrics import _get_coordinates, _jump_lengths, _radius_gyration, wait_time
+from mobmetric.profiling import profile_stage
+from mobmetric.utils import user_segments
+from mobmetric.visits import VisitMatrix
+
+METRICS = ["random", "uncorrelated", "real", "rg", "jump", "wait", "locf"]
+
+
+def compute_metrics(sp, metrics=None, method="count", engine="automaton", print_progress=False, n_jobs=-1):
+    """
+    Compute several individual mobility metrics in a single pass.
+
+    The staypoints are sorted by user once, and the user segments, location codes and visit counts are shared by all
+    requested metrics, instead of grouping the staypoints separately for each metric.
+
+    Parameters
+    ----------
+    sp : Geodataframe or DataFrame
+        Staypoints with column "user_id", ordered in time per user. Depending on the metrics, also "location_id",
+        coordinates (see radius_gyration()) and time information (see wait_time()).
+
+    metrics: list, default None
+        Subset of ["random", "uncorrelated", "real", "rg", "jump", "wait", "locf"] to compute. Compute all if None.
+
+    method: string, {"duration", "count"}, default "count"
+        method to calculate rg, see radius_gyration().
+
+    engine: string, {"automaton", "legacy"}, default "automaton"
+        Method to calculate real entropy, see real_entropy().
+
+    print_progress: boolen, default False
+        Show progress of real entropy if set to True.
+
+    n_jobs: int, default -1
+        Number of parallel jobs for real entropy, passed to joblib.
+
+    Returns
+    -------
+    pandas DataFrame
+        Per-user metrics indexed by "user_id", with one column per requested metric:
+        - "random": "randomEntropy", see random_entropy().
+        - "uncorrelated": "uncorrelatedEntropy", see uncorrelated_entropy().
+        - "real": "realEntropy", see real_entropy().
+        - "rg": "radiusGyration", see radius_gyration().
+        - "jump": "jumpLength", the mean jump length of the user (NaN for users with a single staypoint), see jump_length().
+        - "wait": "waitTime", the mean wait time of the user, see wait_time().
+        - "locf": "locationFrequency", the proportion of visits to the most visited location of the user, see location_frquency().
+
+    """
+    if metrics is None:
+        metrics = METRICS
+    unknown = [metric for metric in metrics if metric not in METRICS]
+    if len(unknown):
+        raise AttributeError(
+            f"Metric unknown. Please check the input arguement. We only support {', '.join(METRICS)}. You passed {unknown}"
+        )
+    if method not in ["duration", "count"]:
+        raise AttributeError(
+            f"Method unknown. Please check the input arguement. We only support 'duration', 'count'. You passed {method}"
+        )
+
+    # sort once by user, user k occupies [offsets[k], offsets[k + 1])
+    with profile_stage("compute_metrics", "segments") as stage:
+        order, offsets, users = user_segments(sp["user_id"])
+        n_users = len(users)
+        visits = np.diff(offsets)
+        user_codes = np.repeat(np.arange(n_users), visits)
+
+        result = pd.DataFrame(index=users)
+
+        if any(metric in metrics for metric in ["random", "uncorrelated", "real", "locf"]):
+            # missing locations are a separate location, see VisitMatrix
+            loc_codes, locs = pd.factorize(np.asarray(sp["location_id"]), sort=True, use_na_sentinel=False)
+            loc_codes = loc_codes[order]
+        stage.rows = len(user_codes)
+
+    if any(metric in metrics for metric in ["random", "uncorrelated", "locf"]):
+        # visit counts per user and location
+        with profile_stage("compute_metrics", "location_counts") as stage:
+            visit_matrix = VisitMatrix._from_codes(user_codes, users, loc_codes, locs)
+            stage.rows = visit_matrix.nnz
+
+    if "random" in metrics:
+        with profile_stage("compute_metrics", "random") as stage:
+            result["randomEntropy"] = visit_matrix.random_entropy().values
+            stage.rows = n_users
+
+    if "uncorrelated" in metrics:
+        with profile_stage("compute_metrics", "uncorrelated") as stage:
+            result["uncorrelatedEntropy"] = visit_matrix.uncorrelated_entropy().values
+            stage.rows = n_users
+
+    if "real" in metrics:
+        with profile_stage("compute_metrics", "real") as stage:
+            result["realEntropy"] = _real_entropy_segments(
+                loc_codes, offsets, n_jobs=n_jobs, print_progress=print_progress, engine=engine
+            ).astype(np.float64)
+            stage.rows = n_users
+
+    if "rg" in metrics or "jump" in metrics:
+        with profile_stage("compute_metrics", "coordinates") as stage:
+            xs, ys, planar = _get_coordinates(sp)
+            xs, ys = xs[order], ys[order]
+            stage.rows = len(xs)
+
+    if "rg" in metrics:
+        with profile_stage("compute_metrics", "rg") as stage:
+            if method == "duration":
+                weights = np.asarray(sp["duration"], dtype=np.float64)[order]
+            else:
+                weights = np.ones(len(user_codes), dtype=np.float64)
+            result["radiusGyration"] = _radius_gyration(user_codes, n_users, xs, ys, weights, planar)
+            stage.rows = n_users
+
+    if "jump" in metrics:
+        with profile_stage("compute_metrics", "jump") as stage:
+            jumps, is_jump = _jump_lengths(user_codes, xs, ys, planar)
+            jump_users = user_codes[1:][is_jump]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result["jumpLength"] = np.bincount(jump_users, weights=jumps, minlength=n_users) / np.bincount(
+                    jump_users, minlength=n_users
+                )
+            stage.rows = len(jumps)
+
+    if "wait" in metrics:
+        with profile_stage("compute_metrics", "wait") as stage:
+            waits = np.asarray(wait_time(sp), dtype=np.float64)[order]
+            result["waitTime"] = np.bincount(user_codes, weights=waits, minlength=n_users) / visits
+            stage.rows = n_users
+
+    if "locf" in metrics:
+        with profile_stage("compute_metrics", "locf") as stage:
+            is_top = visit_matrix.ranks() == 1
+            top_counts = np.zeros(n_users, dtype=np.int64)
+            top_counts[visit_matrix.pair_users[is_top]] = visit_matrix.counts[is_top]
+            result["locationFrequency"] = top_counts / visits
+            stage.rows = n_users
+
+    return result
+
+
+def iter_compute_metrics(sp_chunks, metrics=None, **kwargs):
+    """
+    Compute individual mobility metrics chunk by chunk, for datasets that do not fit into memory.
+
+    Parameters
+    ----------
+    sp_chunks : iterable
+        Staypoints in chunks of complete users, e.g., the return of iter_staypoints(). A user shall not be split across chunks.
+
+    metrics: list, default None
+        Metrics to compute, see compute_metrics().
+
+    **kwargs
+        Further arguments passed to compute_metrics().
+
+    Yields
+    ------
+    pandas DataFrame
+        Per-user metrics of the users in each chunk, see compute_metrics(). Can be written incrementally with write_results().
+
+    """
+    for sp in sp_chunks:
+        yield compute_metrics(sp, metrics=metrics, **kwargs)
@@ -0,0 +1,695 @@
+import numpy as np
+import pandas as pd
+
+FAMILIES = ["power_law", "truncated_power_law", "lognormal"]
+
+# fitted parameters of each family
+PARAMETERS = {"power_law": ["alpha"], "truncated_power_law": ["alpha", "lambda"], "lognormal": ["mu", "sigma"]}
+
+# pairs compared with the loglikelihood ratio, the power law is nested in the truncated power law
+COMPARISONS = [
+    ("power_law", "truncated_power_law"),
+    ("power_law", "lognormal"),
+    ("truncated_power_law", "lognormal"),
+]
+
+# per-bin statistics of LogHistogram
+BIN_STATISTICS = ["counts", "sum_x", "sum_x2", "sum_log", "sum_log2"]
+
+# Nelder-Mead options of the truncated power law and lognormal fits
+OPTIMIZER_OPTIONS = {"xatol": 1e-8, "fatol": 1e-8, "maxiter": 2000}
+
+
+class LogHistogram:
+    """
+    Mergeable log-binned histogram of positive values, built in one streaming pass.
+
+    The bin edges are fixed powers of 10: bin b covers [10^(b / bins_per_decade), 10^((b + 1) / bins_per_decade)), such
+    that histograms of different chunks share their edges. Besides the counts, each bin stores the sums of x, x^2,
+    log(x) and log(x)^2 of its values, the sufficient statistics of the power law, truncated power law and lognormal
+    likelihoods. Fits with xmin at a bin edge are therefore identical to fits on the raw values.
+
+    Histograms of chunks or workers are combined with merge() or merge_histograms(), and the memory is O(bins)
+    regardless of the number of values.
+
+    Parameters
+    ----------
+    bins_per_decade: int, default 20
+        Number of bins per factor of 10.
+
+    Attributes
+    ----------
+    offset : int
+        Index b of the first bin.
+
+    counts, sum_x, sum_x2, sum_log, sum_log2 : np.array
+        Number of values, and sums of x, x^2, log(x) and log(x)^2 of each bin.
+
+    n_nonpositive : int
+        Number of values <= 0 (and NaN), which are not binned.
+
+    Examples
+    --------
+    >>> hist = LogHistogram()
+    >>> for chunk in iter_staypoints("sp.parquet"):
+    ...     hist.update(jump_length(chunk))
+    >>> fit = fit_distributions(hist, xmin=1)
+
+    """
+
+    def __init__(self, bins_per_decade=20):
+        self.bins_per_decade = bins_per_decade
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sum_x = np.zeros(0)
+        self.sum_x2 = np.zeros(0)
+        self.sum_log = np.zeros(0)
+        self.sum_log2 = np.zeros(0)
+        self.n_nonpositive = 0
+
+    def __repr__(self):
+        return f"LogHistogram(n={self.n}, bins={len(self.counts)}, bins_per_decade={self.bins_per_decade})"
+
+    def update(self, values):
+        """
+        Add values to the histogram.
+
+        Parameters
+        ----------
+        values : array-like
+            The values, e.g., the result of mobmetric.jump_length().
+
+        Returns
+        -------
+        LogHistogram
+            The updated histogram (self).
+
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        is_positive = (values > 0) & np.isfinite(values)
+        self.n_nonpositive += int(len(values) - is_positive.sum())
+        values = values[is_positive]
+        if not len(values):
+            return self
+
+        logs = np.log(values)
+        # values on a bin edge (up to rounding, as in edge_index()) belong to the upper bin, i.e., to the tail x >= xmin
+        bins = np.floor(np.log10(values) * self.bins_per_decade + 1e-9).astype(np.int64)
+        self._resize(int(bins.min()), int(bins.max()))
+
+        bins -= self.offset
+        n_bins = len(self.counts)
+        self.counts += np.bincount(bins, minlength=n_bins)
+        self.sum_x += np.bincount(bins, weights=values, minlength=n_bins)
+        self.sum_x2 += np.bincount(bins, weights=values**2, minlength=n_bins)
+        self.sum_log += np.bincount(bins, weights=logs, minlength=n_bins)
+        self.sum_log2 += np.bincount(bins, weights=logs**2, minlength=n_bins)
+        return self
+
+    def merge(self, other):
+        """
+        Add the values of another histogram, e.g., of another chunk or worker.
+
+        Parameters
+        ----------
+        other : LogHistogram
+            Histogram with the same bins_per_decade.
+
+        Returns
+        -------
+        LogHistogram
+            The merged histogram (self), identical (up to floating point) to the histogram of all values.
+
+        """
+        if other.bins_per_decade != self.bins_per_decade:
+            raise AttributeError(
+                f"Histograms of different bins. Please use the same bins_per_decade. You passed "
+                f"{self.bins_per_decade} and {other.bins_per_decade}"
+            )
+        self.n_nonpositive += other.n_nonpositive
+        if not len(other.counts):
+            return self
+
+        self._resize(other.offset, other.offset + len(other.counts) - 1)
+        start = other.offset - self.offset
+        for name in BIN_STATISTICS:
+            getattr(self, name)[start : start + len(other.counts)] += getattr(other, name)
+        return self
+
+    def _resize(self, first, last):
+        """Extend the bins to cover (at least) the bin indices [first, last]."""
+        if len(self.counts):
+            first, last = min(first, self.offset), max(last, self.offset + len(self.counts) - 1)
+        before = self.offset - first if len(self.counts) else 0
+        after = last - first + 1 - len(self.counts) - before
+        if before == 0 and after == 0:
+            return
+        for name in BIN_STATISTICS:
+            setattr(self, name, np.pad(getattr(self, name), (before, after)))
+        self.offset = first
+
+    @property
+    def n(self):
+        """Number of binned (positive) values."""
+        return int(self.counts.sum())
+
+    @property
+    def mean(self):
+        """Mean of the binned values."""
+        return self.sum_x.sum() / self.n if self.n else np.nan
+
+    @property
+    def std(self):
+        """Standard deviation of the binned values."""
+        if not self.n:
+            return np.nan
+        return np.sqrt(max(self.sum_x2.sum() / self.n - self.mean**2, 0))
+
+    @property
+    def edges(self):
+        """Bin edges, of length number of bins + 1."""
+        return 10.0 ** (np.arange(self.offset, self.offset + len(self.counts) + 1) / self.bins_per_decade)
+
+    def edge_index(self, x):
+        """Position of the smallest bin edge >= x (up to rounding), values below this edge are not in the tail."""
+        b = int(np.ceil(np.log10(x) * self.bins_per_decade - 1e-9))
+        return min(max(b - self.offset, 0), len(self.counts))
+
+    def density(self, xmin=None):
+        """
+        Empirical probability density of the bins (above xmin).
+
+        Parameters
+        ----------
+        xmin: float, default None
+            Lower bound, snapped to the smallest bin edge >= xmin. All bins if None.
+
+        Returns
+        -------
+        np.array
+            Geometric centers of the non-empty bins.
+
+        np.array
+            Probability density of the non-empty bins.
+
+        """
+        start = 0 if xmin is None else self.edge_index(xmin)
+        edges, counts = self.edges[start:], self.counts[start:]
+        pdf = counts / max(counts.sum(), 1) / np.diff(edges)
+        centers = np.sqrt(edges[:-1] * edges[1:])
+        is_filled = counts > 0
+        return centers[is_filled], pdf[is_filled]
+
+    def to_frame(self):
+        """
+        The bins as DataFrame, e.g., to store the histogram with write_results().
+
+        Returns
+        -------
+        pandas DataFrame
+            One row per bin indexed by "bin" (the index b), with columns "lower", "upper", "counts", "sum_x",
+            "sum_x2", "sum_log" and "sum_log2". The number of non-positive values is stored in attrs.
+
+        """
+        edges = self.edges
+        df = pd.DataFrame(
+            {"lower": edges[:-1], "upper": edges[1:], **{name: getattr(self, name) for name in BIN_STATISTICS}},
+            index=pd.RangeIndex(self.offset, self.offset + len(self.counts), name="bin"),
+        )
+        df.attrs = {"bins_per_decade": self.bins_per_decade, "n_nonpositive": self.n_nonpositive}
+        return df
+
+    @classmethod
+    def from_frame(cls, df, bins_per_decade=None):
+        """
+        The histogram of bins stored with to_frame().
+
+        Parameters
+        ----------
+        df : pandas DataFrame
+            The bins, see to_frame().
+
+        bins_per_decade: int, default None
+            Number of bins per factor of 10. Taken from attrs or the bin edges if None.
+
+        Returns
+        -------
+        LogHistogram
+            The histogram.
+
+        """
+        if bins_per_decade is None:
+            bins_per_decade = df.attrs.get("bins_per_decade")
+        if bins_per_decade is None:
+            bins_per_decade = int(np.round(1 / np.log10(df["upper"].iloc[0] / df["lower"].iloc[0])))
+
+        hist = cls(bins_per_decade)
+        hist.n_nonpositive = int(df.attrs.get("n_nonpositive", 0))
+        if len(df):
+            hist.offset = int(df.index[0])
+            hist.counts = df["counts"].values.astype(np.int64)
+            for name in BIN_STATISTICS[1:]:
+                setattr(hist, name, df[name].values.astype(np.float64))
+        return hist
+
+
+def merge_histograms(hists):
+    """
+    Merge histograms of different chunks or workers.
+
+    Parameters
+    ----------
+    hists : iterable
+        LogHistograms with the same bins_per_decade, e.g., jump_length_histogram() of each chunk.
+
+    Returns
+    -------
+    LogHistogram
+        The merged histogram. The inputs are not modified.
+
+    Examples
+    --------
+    >>> hist = merge_histograms(jump_length_histogram(chunk) for chunk in iter_staypoints("sp.parquet"))
+
+    """
+    merged = None
+    for hist in hists:
+        if merged is None:
+            merged = LogHistogram(hist.bins_per_decade)
+        merged.merge(hist)
+    if merged is None:
+        raise AttributeError("No histograms to merge.")
+    return merged
+
+
+class DistributionFit:
+    """
+    Fitted power law, truncated power law and lognormal distributions of the values above xmin.
+
+    Use fit_distributions() to construct the fit. The distributions follow the continuous definitions of the
+    powerlaw package [1]:
+    - power_law: p(x) ~ x^(-alpha)
+    - truncated_power_law: p(x) ~ x^(-alpha) * exp(-lambda * x), with alpha in [0, 3]
+    - lognormal: p(x) ~ exp(-(log(x) - mu)^2 / (2 * sigma^2)) / x
+
+    Attributes
+    ----------
+    xmin : float
+        Lower bound of the fitted tail.
+
+    n_tail : int
+        Number of values >= xmin.
+
+    parameters : dict
+        Fitted parameters of each family: {"alpha"}, {"alpha", "lambda"} and {"mu", "sigma"}.
+
+    loglikelihoods : dict
+        Total loglikelihood of the tail under each family.
+
+    ks : dict
+        Kolmogorov-Smirnov distance between the tail and each family (at the bin edges for binned fits).
+
+    comparisons : pandas DataFrame
+        Loglikelihood ratio "R" and its significance "p" for each pair of families, R > 0 favors the first.
+
+    References
+    ----------
+    [1] Alstott, J., Bullmore, E., & Plenz, D. (2014). powerlaw: a Python package for analysis of heavy-tailed distributions. PloS one, 9(1), e85777.
+
+    """
+
+    def __init__(self, xmin, n_tail, parameters, loglikelihoods, ks, comparisons):
+        self.xmin = xmin
+        self.n_tail = n_tail
+        self.parameters = parameters
+        self.loglikelihoods = loglikelihoods
+        self.ks = ks
+        self.comparisons = comparisons
+
+    def __repr__(self):
+        fitted = ", ".join(
+            f"{family}({', '.join(f'{name}={value:.4g}' for name, value in self.parameters[family].items())})"
+            for family in FAMILIES
+        )
+        return f"DistributionFit(xmin={self.xmin:.4g}, n_tail={self.n_tail}, {fitted})"
+
+    def pdf(self, family, x):
+        """
+        Probability density of a fitted family.
+
+        Parameters
+        ----------
+        family : string, {"power_law", "truncated_power_law", "lognormal"}
+            The family.
+
+        x : array-like
+            Values, the density is 0 below xmin.
+
+        Returns
+        -------
+        np.array
+            The density at x.
+
+        """
+        _check_family(family)
+        x = np.asarray(x, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            logs = np.log(x)
+            log_pdf = _log_pdf(family, self.parameters[family], self.xmin, logs, x)
+        return np.where(x >= self.xmin, np.exp(log_pdf), 0.0)
+
+    def to_frame(self):
+        """
+        The fitted parameters, loglikelihoods and KS distances.
+
+        Returns
+        -------
+        pandas DataFrame
+            One row per family, with columns "xmin", "n_tail", "alpha", "lambda", "mu", "sigma", "loglikelihood"
+            and "ks".
+
+        """
+        records = []
+        for family in FAMILIES:
+            record = {"family": family, "xmin": self.xmin, "n_tail": self.n_tail}
+            record.update({name: np.nan for name in ["alpha", "lambda", "mu", "sigma"]})
+            record.update(self.parameters[family])
+            record.update({"loglikelihood": self.loglikelihoods[family], "ks": self.ks[family]})
+            records.append(record)
+        return pd.DataFrame(records).set_index("family")
+
+    @classmethod
+    def from_frame(cls, df, comparisons=None):
+        """
+        The fit stored with to_frame().
+
+        Parameters
+        ----------
+        df : pandas DataFrame
+            The fitted families, see to_frame().
+
+        comparisons: pandas DataFrame, default None
+            The stored comparisons, see the attribute comparisons.
+
+        Returns
+        -------
+        DistributionFit
+            The fit.
+
+        """
+        return cls(
+            df["xmin"].iloc[0],
+            int(df["n_tail"].iloc[0]),
+            {family: {name: df.loc[family, name] for name in PARAMETERS[family]} for family in FAMILIES},
+            {family: df.loc[family, "loglikelihood"] for family in FAMILIES},
+            {family: df.loc[family, "ks"] for family in FAMILIES},
+            comparisons,
+        )
+
+
+def fit_distributions(data, xmin=None, method="binned", bins_per_decade=20, min_tail=50, sample_size=1000000, seed=0):
+    """
+    Fit power law, truncated power law and lognormal distributions to the tail of positive values.
+
+    This replaces powerlaw.Fit(values, xmin=xmin) and its three families for large datasets:
+    - "binned" fits from a LogHistogram in O(bins) memory. The maximum likelihood parameters are exact, as xmin is
+      snapped to the next bin edge (unless below all values). If xmin is None, the xmin minimizing the KS distance of
+      the power law is searched over all bin edges (with at least min_tail values above) at once. KS distances are
+      evaluated at the bin edges, and the variance of the loglikelihood ratio uses the bin means.
+    - "exact" fits a random subsample of at most sample_size raw values with powerlaw.Fit.
+
+    Parameters
+    ----------
+    data : array-like or LogHistogram
+        The values (e.g., the result of mobmetric.jump_length()), or their histogram for method "binned".
+
+    xmin: float, default None
+        Lower bound of the tail. Searched if None.
+
+    method: string, {"binned", "exact"}, default "binned"
+        Fit from the log-binned histogram, or from a subsample of the raw values.
+
+    bins_per_decade: int, default 20
+        Number of bins per factor of 10 if data is not a LogHistogram.
+
+    min_tail: int, default 50
+        Minimal number of values above the searched xmin for method "binned".
+
+    sample_size: int, default 1000000
+        Maximal number of values for method "exact".
+
+    seed: int, default 0
+        Seed of the subsample for method "exact".
+
+    Returns
+    -------
+    DistributionFit
+        The fitted families and their comparison.
+
+    Examples
+    --------
+    >>> fit = fit_distributions(jump_length(sp), xmin=1)
+    >>> fit.parameters["power_law"]["alpha"]
+    >>> fit.comparisons
+
+    """
+    if method not in ["binned", "exact"]:
+        raise AttributeError(
+            f"Method unknown. Please check the input arguement. We only support 'binned', 'exact'. You passed {method}"
+        )
+
+    if method == "exact":
+        if isinstance(data, LogHistogram):
+            raise AttributeError("Method 'exact' requires the raw values. Please pass an array, not a LogHistogram.")
+        return _fit_exact(data, xmin, sample_size, seed)
+
+    hist = data if isinstance(data, LogHistogram) else LogHistogram(bins_per_decade).update(data)
+    if hist.n == 0:
+        raise AttributeError("No positive values to fit.")
+    start = _search_xmin(hist, min_tail) if xmin is None else hist.edge_index(xmin)
+    if hist.counts[start:].sum() < 2:
+        raise AttributeError(f"Less than 2 values above xmin. You passed {xmin}")
+    # below the first bin, all values are in the tail and the given xmin is exact
+    if xmin is None or start > 0 or xmin > hist.edges[0]:
+        xmin = hist.edges[start]
+    return _fit_binned(hist, start, xmin)
+
+
+def _check_family(family):
+    if family not in FAMILIES:
+        raise AttributeError(
+            f"Family unknown. Please check the input arguement. We only support {', '.join(FAMILIES)}. "
+            f"You passed {family}"
+        )
+
+
+def _tail_statistics(hist, start):
+    """Number of values, and sums of x, log(x) and log(x)^2 of the bins from start."""
+    return (
+        hist.counts[start:].sum(),
+        hist.sum_x[start:].sum(),
+        hist.sum_log[start:].sum(),
+        hist.sum_log2[start:].sum(),
+    )
+
+
+def _search_xmin(hist, min_tail):
+    """
+    Bin edge minimizing the KS distance of the power law fitted above it, for all candidate edges at once.
+
+    Returns the position of the edge.
+    """
+    edges = hist.edges
+    # tail statistics of each candidate edge from reverse cumulative sums
+    n_tails = np.cumsum(hist.counts[::-1])[::-1]
+    log_tails = np.cumsum(hist.sum_log[::-1])[::-1]
+    candidates = np.flatnonzero((n_tails >= max(min_tail, 2)) & (hist.counts > 0))
+    if not len(candidates):
+        return 0
+
+    log_xmins = np.log(edges[candidates])
+    with np.errstate(divide="ignore"):
+        alphas = 1 + n_tails[candidates] / (log_tails[candidates] - n_tails[candidates] * log_xmins)
+
+    # empirical and fitted CDF at the upper bin edges, rows are the candidates
+    positions = np.arange(len(hist.counts))
+    is_tail = positions[None, :] >= candidates[:, None]
+    cum_counts = np.cumsum(hist.counts)
+    below = np.where(candidates > 0, cum_counts[candidates - 1], 0)
+    empirical = (cum_counts[None, :] - below[:, None]) / n_tails[candidates][:, None]
+    with np.errstate(over="ignore", invalid="ignore"):
+        fitted = 1 - np.exp((1 - alphas[:, None]) * (np.log(edges[1:])[None, :] - log_xmins[:, None]))
+    distances = np.where(is_tail, np.abs(empirical - fitted), 0).max(axis=1)
+    distances[~np.isfinite(alphas) | (alphas <= 1)] = np.inf
+    return candidates[np.argmin(distances)]
+
+
+def _fit_binned(hist, start, xmin):
+    """Maximum likelihood fits of the bins from start with lower bound xmin, see fit_distributions()."""
+    from scipy.optimize import minimize
+
+    n, sum_x, sum_log, sum_log2 = _tail_statistics(hist, start)
+    log_xmin = np.log(xmin)
+    parameters, loglikelihoods = {}, {}
+
+    # power law: closed form
+    alpha = 1 + n / (sum_log - n * log_xmin)
+    parameters["power_law"] = {"alpha": alpha}
+    loglikelihoods["power_law"] = n * np.log(alpha - 1) - n * log_xmin - alpha * (sum_log - n * log_xmin)
+
+    # lognormal truncated at xmin: the sums of log(x) and log(x)^2 determine the likelihood
+    mean_log = sum_log / n
+    std_log = np.sqrt(max(sum_log2 / n - mean_log**2, 1e-12))
+
+    def _lognormal_nll(params):
+        return -_lognormal_ll(params[0], np.exp(params[1]), log_xmin, n, sum_log, sum_log2)
+
+    result = minimize(_lognormal_nll, [mean_log, np.log(std_log)], method="Nelder-Mead", options=OPTIMIZER_OPTIONS)
+    parameters["lognormal"] = {"mu": result.x[0], "sigma": np.exp(result.x[1])}
+    loglikelihoods["lognormal"] = -result.fun
+
+    # truncated power law: the sums of x and log(x) determine the likelihood
+    def _truncated_nll(params):
+        return -_truncated_power_law_ll(params[0], np.exp(params[1]), xmin, n, sum_x, sum_log)
+
+    # alpha within [0, 3] as in powerlaw
+    init = [np.clip(alpha, 0, 3), np.log(1 / (sum_x / n) / 10)]
+    bounds = [(0, 3), (None, None)]
+    result = minimize(_truncated_nll, init, method="Nelder-Mead", bounds=bounds, options=OPTIMIZER_OPTIONS)
+    parameters["truncated_power_law"] = {"alpha": result.x[0], "lambda": np.exp(result.x[1])}
+    loglikelihoods["truncated_power_law"] = -result.fun
+
+    # per-bin loglikelihoods at the bin means, for the variance of the loglikelihood ratios
+    counts = hist.counts[start:]
+    is_filled = counts > 0
+    counts = counts[is_filled]
+    mean_logs = hist.sum_log[start:][is_filled] / counts
+    mean_xs = hist.sum_x[start:][is_filled] / counts
+    bin_lls = {family: _log_pdf(family, parameters[family], xmin, mean_logs, mean_xs) for family in FAMILIES}
+
+    # KS distances at the upper bin edges
+    upper = hist.edges[start + 1 :]
+    empirical = np.cumsum(hist.counts[start:]) / n
+    ks = {family: np.abs(empirical - _cdf(family, parameters[family], xmin, upper)).max() for family in FAMILIES}
+
+    comparisons = []
+    for first, second in COMPARISONS:
+        ratio = loglikelihoods[first] - loglikelihoods[second]
+        differences = bin_lls[first] - bin_lls[second]
+        mean_difference = ratio / n
+        variance = np.sum(counts * (differences - mean_difference) ** 2) / n
+        comparisons.append(_compare(first, second, ratio, variance, n))
+
+    return DistributionFit(xmin, int(n), parameters, loglikelihoods, ks, pd.DataFrame(comparisons))
+
+
+def _fit_exact(values, xmin, sample_size, seed):
+    """Fits of a random subsample of the raw values with powerlaw.Fit, see fit_distributions()."""
+    import powerlaw
+
+    values = np.asarray(values, dtype=np.float64).ravel()
+    values = values[(values > 0) & np.isfinite(values)]
+    if len(values) > sample_size:
+        values = np.random.default_rng(seed).choice(values, size=int(sample_size), replace=False)
+
+    fit = powerlaw.Fit(values, xmin=xmin, verbose=False)
+    parameters = {
+        "power_law": {"alpha": fit.power_law.alpha},
+        "truncated_power_law": {"alpha": fit.truncated_power_law.alpha, "lambda": fit.truncated_power_law.Lambda},
+        "lognormal": {"mu": fit.lognormal.mu, "sigma": fit.lognormal.sigma},
+    }
+    loglikelihoods = {family: np.sum(getattr(fit, family).loglikelihoods(fit.data)) for family in FAMILIES}
+    ks = {family: getattr(fit, family).D for family in FAMILIES}
+
+    comparisons = []
+    for first, second in COMPARISONS:
+        ratio, p = fit.distribution_compare(first, second, normalized_ratio=False)
+        comparisons.append({"first": first, "second": second, "R": ratio, "p": p})
+
+    return DistributionFit(fit.xmin, len(fit.data), parameters, loglikelihoods, ks, pd.DataFrame(comparisons))
+
+
+def _compare(first, second, ratio, variance, n):
+    """Significance of the loglikelihood ratio, with the chi2 test for nested families and Vuong's test otherwise."""
+    from scipy.special import erfc
+    from scipy.stats import chi2
+
+    if (first, second) == ("power_law", "truncated_power_law"):
+        p = chi2.sf(abs(2 * ratio), 1)
+    else:
+        p = erfc(abs(ratio) / np.sqrt(2 * n * variance)) if variance > 0 else 1.0
+    return {"first": first, "second": second, "R": ratio, "p": p}
+
+
+def _lognormal_ll(mu, sigma, log_xmin, n, sum_log, sum_log2):
+    """Loglikelihood of the lognormal truncated at xmin from the sums of log(x) and log(x)^2."""
+    from scipy.special import log_ndtr
+
+    squares = sum_log2 - 2 * mu * sum_log + n * mu**2
+    return (
+        -sum_log
+        - n * np.log(sigma)
+        - n * 0.5 * np.log(2 * np.pi)
+        - squares / (2 * sigma**2)
+        - n * log_ndtr((mu - log_xmin) / sigma)
+    )
+
+
+def _truncated_power_law_ll(alpha, lambda_, xmin, n, sum_x, sum_log):
+    """Loglikelihood of the truncated power law above xmin from the sums of x and log(x)."""
+    return -alpha * sum_log - lambda_ * sum_x - n * _log_truncated_norm(alpha, lambda_, xmin)
+
+
+def _log_truncated_norm(alpha, lambda_, x):
+    """log of the integral of t^(-alpha) * exp(-lambda * t) from x to infinity."""
+    from scipy.integrate import quad
+
+    # substitute t = x * exp(s), and shift the exponent by its maximum at s_max to avoid overflow
+    scale = lambda_ * x
+    s_max = np.log((1 - alpha) / scale) if alpha < 1 and (1 - alpha) > scale else 0.0
+
+    def _exponent(s):
+        with np.errstate(over="ignore"):
+            return (1 - alpha) * s - scale * np.expm1(s)
+
+    peak = _exponent(s_max)
+    integral = quad(lambda s: np.exp(_exponent(s) - peak), s_max, np.inf)[0]
+    if s_max > 0:
+        integral += quad(lambda s: np.exp(_exponent(s) - peak), 0, s_max)[0]
+    if not integral > 0:
+        return np.inf
+    return (1 - alpha) * np.log(x) - scale + peak + np.log(integral)
+
+
+def _log_pdf(family, params, xmin, logs, xs):
+    """Log density of a family at the values with logarithms logs."""
+    if family == "power_law":
+        alpha = params["alpha"]
+        return np.log(alpha - 1) - np.log(xmin) - alpha * (logs - np.log(xmin))
+    if family == "truncated_power_law":
+        alpha, lambda_ = params["alpha"], params["lambda"]
+        return -alpha * logs - lambda_ * xs - _log_truncated_norm(alpha, lambda_, xmin)
+    from scipy.special import log_ndtr
+
+    mu, sigma = params["mu"], params["sigma"]
+    return (
+        -logs
+        - np.log(sigma)
+        - 0.5 * np.log(2 * np.pi)
+        - (logs - mu) ** 2 / (2 * sigma**2)
+        - log_ndtr((mu - np.log(xmin)) / sigma)
+    )
+
+
+def _cdf(family, params, xmin, xs):
+    """Cumulative distribution of a family above xmin."""
+    if family == "power_law":
+        return 1 - (xs / xmin) ** (1 - params["alpha"])
+    if family == "truncated_power_law":
+        alpha, lambda_ = params["alpha"], params["lambda"]
+        log_norm = _log_truncated_norm(alpha, lambda_, xmin)
+        return 1 - np.exp([_log_truncated_norm(alpha, lambda_, x) - log_norm for x in xs])
+    from scipy.special import log_ndtr
+
+    mu, sigma = params["mu"], params["sigma"]
+    return 1 - np.exp(log_ndtr((mu - np.log(xs)) / sigma) - log_ndtr((mu - np.log(xmin)) / sigma))
@@ -1,8 +1,10 @@
 import numpy as np
+import pandas as pd
 
-from tqdm import tqdm
-
-from mobmetric.utils import applyParallel
+from mobmetric import kernels
+from mobmetric.profiling import profile_stage
+from mobmetric.visits import VisitMatrix
+from mobmetric.utils import apply_segments_parallel, user_segments
 
 
 def random_entropy(sp, print_progress=False):
@@ -14,7 +16,7 @@ def random_entropy(sp, print_progress=False):
         Staypoints with column "location_id".
 
     print_progress: boolen, default False
-        Show per-user progress if set to True.
+        Not used, the calculation is vectorized over all users. Kept for compatibility.
 
     Returns
     -------
@@ -26,17 +28,11 @@ def random_entropy(sp, print_progress=False):
     [1] Song, C., Qu, Z., Blumm, N. and Barabási, A.L., 2010. Limits of predictability in human mobility. Science, 327(5968), pp.1018-1021.
 
     """
-    if print_progress:
-        tqdm.pandas(desc="User random entropy calculation")
-        s = sp.groupby("user_id").progress_apply(lambda x: _random_entropy_user(x))
-    else:
-        s = sp.groupby("user_id").apply(lambda x: _random_entropy_user(x))
-
-    s.rename("randomEntropy", inplace=True)
-    return s
+    # missing locations count as one location, as in unique()
+    return VisitMatrix.from_staypoints(sp).random_entropy()
 
 
-def uncorrelated_entropy(stps, print_progress=False):
+def uncorrelated_entropy(stps, print_progress=False, method="count"):
     """
     Uncorrelated entropy of individual visited locations.
 
@@ -46,7 +42,11 @@ def uncorrelated_entropy(stps, print_progress=False):
         Staypoints with column "location_id".
 
     print_progress: boolen, default False
-        Show per-user progress if set to True.
+        Not used, the calculation is vectorized over all users. Kept for compatibility.
+
+    method: string, {"duration", "count"}, default "count"
+        method to calculate the location probabilities. "count" uses the visit frequency of locations, and "duration"
+        uses the proportion of time spent at locations, which requires column "duration".
 
     Returns
     -------
@@ -58,17 +58,16 @@ def uncorrelated_entropy(stps, print_progress=False):
     [1] Song, C., Qu, Z., Blumm, N. and Barabási, A.L., 2010. Limits of predictability in human mobility. Science, 327(5968), pp.1018-1021.
 
     """
-    if print_progress:
-        tqdm.pandas(desc="User uncorrelated entropy calculation")
-        s = stps.groupby("user_id").progress_apply(lambda x: _uncorrelated_entropy_user(x))
-    else:
-        s = stps.groupby("user_id").apply(lambda x: _uncorrelated_entropy_user(x))
+    if method not in ["duration", "count"]:
+        raise AttributeError(
+            f"Method unknown. Please check the input arguement. We only support 'duration', 'count'. You passed {method}"
+        )
 
-    s.rename("uncorrelatedEntropy", inplace=True)
-    return s
+    # missing locations are not considered, as in value_counts()
+    return VisitMatrix.from_staypoints(stps).uncorrelated_entropy(method=method)
 
 
-def real_entropy(stps, print_progress=False, n_jobs=-1):
+def real_entropy(stps, print_progress=False, n_jobs=-1, engine="automaton"):
     """
     Real entropy of individual visited locations.
 
@@ -78,7 +77,15 @@ def real_entropy(stps, print_progress=False, n_jobs=-1):
         Staypoints with column "location_id".
 
     print_progress: boolen, default False
-        Show per-user progress if set to True.
+        Show progress over the chunks of users if set to True.
+
+    n_jobs: int, default -1
+        Number of parallel jobs, passed to joblib. Users are batched into chunks balanced by trace length, see apply_segments_parallel(). With the "numba" backend (see set_backend()), the number of threads of the compiled kernel.
+
+    engine: string, {"automaton", "legacy"}, default "automaton"
+        Method to search for the shortest unseen substrings. "automaton" uses an incremental suffix automaton and
+        runs in linear time per user. "legacy" uses the original sliding window search (roughly cubic in the trace
+        length) and is kept for regression comparison. Both return identical values.
 
     Returns
     -------
@@ -90,48 +97,177 @@ def real_entropy(stps, print_progress=False, n_jobs=-1):
     [1] Song, C., Qu, Z., Blumm, N. and Barabási, A.L., 2010. Limits of predictability in human mobility. Science, 327(5968), pp.1018-1021.
 
     """
-    s = applyParallel(stps.groupby("user_id"), _real_entropy_user, print_progress=print_progress, n_jobs=n_jobs)
-    s.index.name = "user_id"
-    s.rename("realEntropy", inplace=True)
-    return s
+    if engine not in ["automaton", "legacy"]:
+        raise AttributeError(
+            f"Engine unknown. Please check the input arguement. We only support 'automaton', 'legacy'. You passed {engine}"
+        )
+
+    # ship only the location codes and the user offsets to the workers
+    with profile_stage("real_entropy", "segments") as stage:
+        order, offsets, users = user_segments(stps["user_id"])
+        locs = pd.factorize(np.asarray(stps["location_id"]))[0][order]
+        stage.rows = len(locs)
+
+    with profile_stage("real_entropy", "lambda_sums") as stage:
+        s = _real_entropy_segments(locs, offsets, n_jobs=n_jobs, print_progress=print_progress, engine=engine)
+        stage.rows = len(s)
+    return pd.Series(s, index=users, name="realEntropy", dtype=np.float64)
 
 
-def _random_entropy_user(sp_user):
+def update_entropy_states(states, stps):
     """
-    User level random entropy calculation, see random_entropy() for details.
+    Update the entropy states of individuals with new staypoints, and get the updated entropies.
 
     Parameters
     ----------
-    stps_user : Geodataframe
-        The staypoints from an individual, should contain column "location_id".
+    states : dict
+        Entropy states {user_id: EntropyState}, updated in place. States for new users are created. The dict can be
+        persisted with pickle between updates.
+
+    stps : Geodataframe
+        New staypoints with columns "user_id" and "location_id" (and "duration" for duration weighted uncorrelated
+        entropy), ordered in time per user and following the staypoints of previous updates.
 
     Returns
     -------
-    float
-        the random entropy of the individual
+    pandas DataFrame
+        The updated "randomEntropy", "uncorrelatedEntropy" and "realEntropy" of the users in stps.
+
     """
-    return np.log(len(sp_user["location_id"].unique()))
+    order, offsets, users = user_segments(stps["user_id"])
+    locs = np.asarray(stps["location_id"])[order].tolist()
+    durations = np.asarray(stps["duration"], dtype=np.float64)[order] if "duration" in stps.columns else None
+
+    for k, user in enumerate(users):
+        segment = slice(offsets[k], offsets[k + 1])
+        state = states.setdefault(user, EntropyState())
+        state.update(locs[segment], durations=None if durations is None else durations[segment])
+
+    return pd.DataFrame(
+        {
+            "randomEntropy": [states[user].random_entropy() for user in users],
+            "uncorrelatedEntropy": [states[user].uncorrelated_entropy() for user in users],
+            "realEntropy": [states[user].real_entropy() for user in users],
+        },
+        index=users,
+    )
+
+
+class EntropyState:
+    """
+    Entropy state of an individual that can be extended with new staypoints, without recomputing the whole history.
 
+    The state keeps the visit counts (and durations) per location for random and uncorrelated entropy, and the
+    resumable suffix automaton search of real entropy. The cost of an update is linear in the new staypoints (and the
+    last unfinished match). The state can be persisted with pickle.
+    """
 
-def _uncorrelated_entropy_user(stps_user):
+    def __init__(self):
+        self.location_counts = {}
+        self.location_durations = {}
+        # False once staypoints are appended without durations, duration weighted entropy is then undefined
+        self.durations_complete = True
+        self._real = _RealEntropyState()
+
+    def __len__(self):
+        return len(self._real.locs)
+
+    def update(self, location_ids, durations=None):
+        """
+        Append staypoints of the individual.
+
+        Parameters
+        ----------
+        location_ids : list
+            The "location_id" of the new staypoints, ordered in time.
+
+        durations: list, default None
+            The "duration" of the new staypoints, for duration weighted uncorrelated entropy. Duration weighted
+            uncorrelated entropy requires the durations of all updates.
+
+        Returns
+        -------
+        EntropyState
+            The updated state itself.
+        """
+        location_ids = np.asarray(location_ids).tolist()
+        if durations is not None and len(durations) != len(location_ids):
+            raise AttributeError(
+                f"Durations do not match the locations. Please provide one duration per location. You passed "
+                f"{len(durations)} durations for {len(location_ids)} locations"
+            )
+
+        for loc in location_ids:
+            self.location_counts[loc] = self.location_counts.get(loc, 0) + 1
+        if durations is not None:
+            for loc, duration in zip(location_ids, durations):
+                self.location_durations[loc] = self.location_durations.get(loc, 0.0) + float(duration)
+        elif len(location_ids):
+            self.durations_complete = False
+
+        self._real.extend(location_ids)
+        return self
+
+    def random_entropy(self):
+        """Random entropy of the visited locations, see random_entropy()."""
+        return np.log(len(self.location_counts))
+
+    def uncorrelated_entropy(self, method="count"):
+        """Uncorrelated entropy of the visited locations, see uncorrelated_entropy()."""
+        if method not in ["duration", "count"]:
+            raise AttributeError(
+                f"Method unknown. Please check the input arguement. We only support 'duration', 'count'. You passed {method}"
+            )
+        if method == "duration" and not self.durations_complete:
+            raise AttributeError(
+                "Durations not found. The durations of all updates are required for method 'duration', "
+                "please provide the column 'duration'."
+            )
+        counts = self.location_durations if method == "duration" else self.location_counts
+        locs_prob = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        locs_prob = locs_prob / locs_prob.sum()
+        return -(locs_prob * np.log(locs_prob)).sum()
+
+    def real_entropy(self):
+        """Real entropy of the visited locations, see real_entropy()."""
+        n = len(self)
+        # the function S5 from the suppl. material
+        return 1.0 / (self._real.lambda_sum() * 1 / n) * np.log(n)
+
+
+def _real_entropy_segments(locs, offsets, n_jobs=-1, print_progress=False, engine="automaton"):
     """
-    User level uncorrelated entropy calculation, see uncorrelated_entropy() for details.
+    Real entropy of each user from flat location codes sorted by user, see real_entropy() for details.
+
+    With the "numba" backend (see set_backend()), the "automaton" engine runs the compiled kernel in parallel threads
+    instead of the joblib workers, and print_progress is not used.
 
     Parameters
     ----------
-    stps_user : Geodataframe
-        The staypoints from an individual, should contain column "location_id".
+    locs : np.array
+        Integer location codes, sorted by user.
+
+    offsets : np.array
+        Offsets of length n_users + 1, the locations of user k are locs[offsets[k]:offsets[k + 1]].
 
     Returns
     -------
-    float
-        the temporal-uncorrelated entropy of the individual
+    np.array
+        The real entropy of each user.
+
     """
-    locs_prob = stps_user["location_id"].value_counts(normalize=True, sort=False).values
-    return -(locs_prob * np.log(locs_prob)).sum()
+    if engine == "automaton" and kernels.get_backend() == "numba":
+        sum_lambda = kernels.lambda_sums(locs, offsets, n_jobs=n_jobs)
+        n = np.diff(offsets)
+        # the function S5 from the suppl. material, as in _real_entropy_sequence()
+        return 1.0 / (sum_lambda * 1 / n) * np.log(n)
 
+    return apply_segments_parallel(
+        _real_entropy_sequence, (locs,), offsets, n_jobs=n_jobs, print_progress=print_progress, engine=engine
+    )
 
-def _real_entropy_user(stps_user):
+
+def _real_entropy_user(stps_user, engine="automaton"):
     """
     User level real entropy calculation, see real_entropy() for details.
 
@@ -140,13 +276,59 @@ def _real_entropy_user(stps_user):
     stps_user : Geodataframe
         The staypoints from an individual, should contain column "location_id".
 
+    engine: string, {"automaton", "legacy"}, default "automaton"
+        Method to search for the shortest unseen substrings.
+
     Returns
     -------
     float
         the real entropy of the individual
     """
-    locs_series = stps_user["location_id"].values
+    return _real_entropy_sequence(stps_user["location_id"].values, engine=engine)
+
+
+def _real_entropy_sequence(locs_series, engine="automaton"):
+    """
+    Real entropy of a location sequence, see real_entropy() for details.
+
+    Parameters
+    ----------
+    locs_series : np.array
+        The location sequence of an individual.
+
+    engine: string, {"automaton", "legacy"}, default "automaton"
+        Method to search for the shortest unseen substrings.
+
+    Returns
+    -------
+    float
+        the real entropy of the sequence
+    """
+    n = len(locs_series)
+
+    if engine == "legacy":
+        sum_lambda = _lambda_sum_legacy(locs_series)
+    else:
+        sum_lambda = _lambda_sum_automaton(locs_series)
+
+    # the function S5 from the suppl. material
+    return 1.0 / (sum_lambda * 1 / n) * np.log(n)
+
+
+def _lambda_sum_legacy(locs_series):
+    """
+    Sum of the shortest unseen substring lengths, searched with sliding windows over the history.
 
+    Parameters
+    ----------
+    locs_series : np.array
+        The location sequence of an individual.
+
+    Returns
+    -------
+    int
+        the sum of the shortest substring lengths
+    """
     n = len(locs_series)
 
     # 1 to ensure to consider the first situation from where
@@ -175,5 +357,169 @@ def _real_entropy_user(stps_user):
         # length of the substring
         sum_lambda += j - i
 
-    # the function S5 from the suppl. material
-    return 1.0 / (sum_lambda * 1 / n) * np.log(n)
+    return sum_lambda
+
+
+def _lambda_sum_automaton(locs_series):
+    """
+    Sum of the shortest unseen substring lengths, searched with an incremental suffix automaton.
+
+    Parameters
+    ----------
+    locs_series : np.array
+        The location sequence of an individual.
+
+    Returns
+    -------
+    int
+        the sum of the shortest substring lengths, identical to _lambda_sum_legacy()
+    """
+    # map locations to consecutive integers for cheap hashing
+    real_state = _RealEntropyState()
+    real_state.extend(pd.factorize(locs_series)[0].tolist())
+    return real_state.lambda_sum()
+
+
+class _RealEntropyState:
+    """
+    Resumable search of the shortest unseen substrings of a growing location sequence, see _lambda_sum_automaton().
+
+    The shortest substring starting at i that does not exist in locs[:i] is one longer than the longest match of
+    locs[i:] in locs[:i]. The match at i + 1 is at least the match at i minus its first element, thus the match is
+    carried over between positions (matching statistics) and the total work is linear. Once the match at a position
+    reaches the end of the sequence, the matches of all later positions also reach the end and their lengths are
+    known (n - i). These positions stay open, and are resumed when the sequence is extended.
+    """
+
+    def __init__(self):
+        self.locs = []
+        # suffix automaton of locs[:position]
+        self.sam = _SuffixAutomaton()
+        # first open position, the current match locs[position:position + length] is represented by the automaton state
+        self.position = 1
+        self.state, self.length = 0, 0
+        # 1 to ensure to consider the first situation, plus the lambda of the closed positions
+        self.closed_sum = 1
+
+    def extend(self, new_locs):
+        """
+        Append locations to the sequence and close the positions whose match ends before the end of the sequence.
+
+        Parameters
+        ----------
+        new_locs : list
+            The appended (hashable) locations.
+        """
+        locs, sam = self.locs, self.sam
+        if not len(locs) and len(new_locs):
+            sam.extend(new_locs[0])
+        locs.extend(new_locs)
+        n = len(locs)
+
+        position, state, length, closed_sum = self.position, self.state, self.length, self.closed_sum
+        while position < n - 1:
+            # extend the match as far as possible in locs[:position]
+            while position + length < n:
+                next_state = sam.next[state].get(locs[position + length])
+                if next_state is None:
+                    break
+                state = next_state
+                length += 1
+
+            # the match reaches the end of the sequence, might be extended with future locations
+            if position + length == n:
+                break
+
+            # length of the "shortest substring" that does not exist in locs[:position]
+            closed_sum += length + 1
+
+            # drop the first element of the match for position + 1
+            if length > 0:
+                length -= 1
+                if length <= sam.length[sam.link[state]]:
+                    state = sam.link[state]
+
+            # add locs[position] to the history, the state of the match is split if a clone is created
+            split_state, clone = sam.extend(locs[position])
+            if state == split_state and length <= sam.length[clone]:
+                state = clone
+            position += 1
+
+        self.position, self.state, self.length, self.closed_sum = position, state, length, closed_sum
+
+    def lambda_sum(self):
+        """
+        Sum of the shortest unseen substring lengths of the current sequence.
+
+        Returns
+        -------
+        int
+            the sum of the shortest substring lengths, identical to _lambda_sum_legacy()
+        """
+        # open positions i in [position, n - 2] have the lambda n - i + 1, i.e., from n - position + 1 down to 3
+        longest = len(self.locs) - self.position + 1
+        if longest < 3:
+            return self.closed_sum
+        return self.closed_sum + (longest + 3) * (longest - 2) // 2
+
+
+class _SuffixAutomaton:
+    """
+    Suffix automaton of a sequence that can be extended one element at a time.
+
+    States are stored in parallel lists: "length" of the longest substring of the state, suffix "link" and the
+    transitions "next". State 0 is the root that represents the empty substring.
+    """
+
+    def __init__(self):
+        self.length = [0]
+        self.link = [-1]
+        self.next = [{}]
+        self.last = 0
+
+    def extend(self, c):
+        """
+        Append element c to the sequence.
+
+        Parameters
+        ----------
+        c : hashable
+            The appended element.
+
+        Returns
+        -------
+        tuple
+            (split_state, clone) if an existing state was split during the extension, otherwise (-1, -1). Substrings
+            of split_state with length up to length[clone] are moved to clone.
+        """
+        length, link, nxt = self.length, self.link, self.next
+
+        cur = len(length)
+        length.append(length[self.last] + 1)
+        link.append(0)
+        nxt.append({})
+
+        p = self.last
+        while p != -1 and c not in nxt[p]:
+            nxt[p][c] = cur
+            p = link[p]
+        self.last = cur
+
+        if p == -1:
+            return -1, -1
+
+        q = nxt[p][c]
+        if length[p] + 1 == length[q]:
+            link[cur] = q
+            return -1, -1
+
+        clone = len(length)
+        length.append(length[p] + 1)
+        link.append(link[q])
+        nxt.append(nxt[q].copy())
+        while p != -1 and nxt[p].get(c) == q:
+            nxt[p][c] = clone
+            p = link[p]
+        link[q] = clone
+        link[cur] = clone
+        return q, clone
@@ -0,0 +1,296 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+FILE_FORMATS = ["csv", "parquet", "feather"]
+
+
+def read_staypoints(
+    path, file_format=None, columns=None, index_col=None, geometry=True, categorical_ids=False, crs="EPSG:4326"
+):
+    """
+    Read staypoints from a CSV, Parquet or Feather file.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+
+    file_format: string, {"csv", "parquet", "feather"}, default None
+        Format of the file. Inferred from the file extension if None.
+
+    columns: list, default None
+        Columns to read, e.g., ["user_id", "location_id"] for entropy calculations. Only these columns are parsed from
+        the file. Read all columns if None.
+
+    index_col: string, default None
+        Column to use as index.
+
+    geometry: boolen, default True
+        If True, return a Geodataframe. The geometry is parsed from the "geometry" column (WKT strings in CSV, WKB in
+        Parquet/Feather or GeoParquet files) with vectorized shapely, or constructed from float columns "lng" and "lat"
+        if no "geometry" column exists. If False, return a DataFrame without geometry parsing.
+
+    categorical_ids: boolen, default False
+        If True, store "user_id" and "location_id" as dictionary encoded categoricals to reduce memory.
+
+    crs: string, default "EPSG:4326"
+        Coordinate reference system of the geometry.
+
+    Returns
+    -------
+    (Geo)DataFrame
+        The staypoints.
+
+    """
+    file_format = _get_file_format(path, file_format)
+    read_columns = _get_read_columns(columns, index_col)
+
+    if file_format == "csv":
+        sp = pd.read_csv(path, usecols=read_columns)
+    elif file_format == "parquet":
+        sp = pd.read_parquet(path, columns=read_columns)
+    else:
+        sp = pd.read_feather(path, columns=read_columns)
+
+    return _prepare_staypoints(sp, index_col, geometry, categorical_ids, crs)
+
+
+def iter_staypoints(
+    path,
+    file_format=None,
+    chunksize=1000000,
+    columns=None,
+    index_col=None,
+    geometry=True,
+    categorical_ids=False,
+    crs="EPSG:4326",
+):
+    """
+    Read staypoints in chunks of complete users from a CSV, Parquet or Feather file.
+
+    The file is read in chunks of about chunksize rows (CSV chunks, Parquet row groups or Feather record batches),
+    and the rows of the last user of a chunk are held back until the user is complete. Thus, a user is never split
+    across chunks, and the peak memory is bounded by the chunk size and the largest user instead of the file size.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file. The staypoints of each user shall be stored contiguously, e.g., sorted by "user_id". Users
+        that are not stored contiguously are detected within a chunk and between consecutive chunks.
+
+    file_format: string, {"csv", "parquet", "feather"}, default None
+        Format of the file. Inferred from the file extension if None.
+
+    chunksize: int, default 1000000
+        Number of rows read at once.
+
+    columns, index_col, geometry, categorical_ids, crs:
+        See read_staypoints().
+
+    Yields
+    ------
+    (Geo)DataFrame
+        The staypoints of complete users.
+
+    """
+    file_format = _get_file_format(path, file_format)
+    read_columns = _get_read_columns(columns, index_col)
+    if read_columns is not None and "user_id" not in read_columns:
+        read_columns.append("user_id")
+
+    previous_user = None
+    held_back = None
+    for chunk in _iter_raw_chunks(path, file_format, chunksize, read_columns):
+        if held_back is not None:
+            chunk = pd.concat([held_back, chunk], ignore_index=True)
+        if len(chunk) == 0:
+            continue
+
+        # the trailing run of the last user might continue in the next chunk
+        user_ids = chunk["user_id"].values
+        is_other_user = user_ids[::-1] != user_ids[-1]
+        split = len(chunk) - np.argmax(is_other_user) if is_other_user.any() else 0
+
+        complete, held_back = chunk.iloc[:split], chunk.iloc[split:]
+        if len(complete):
+            previous_user = _check_contiguous_users(complete["user_id"], previous_user)
+            yield _prepare_staypoints(complete, index_col, geometry, categorical_ids, crs)
+
+    if held_back is not None and len(held_back):
+        _check_contiguous_users(held_back["user_id"], previous_user)
+        yield _prepare_staypoints(held_back, index_col, geometry, categorical_ids, crs)
+
+
+def write_results(results, path, file_format=None):
+    """
+    Write per-user results incrementally to a CSV or Parquet file.
+
+    Parameters
+    ----------
+    results : iterable
+        DataFrames to write, e.g., the return of iter_compute_metrics(). All DataFrames shall have the same columns.
+
+    path : str
+        Path to the output file.
+
+    file_format: string, {"csv", "parquet"}, default None
+        Format of the file. Inferred from the file extension if None.
+
+    Returns
+    -------
+    int
+        The number of written rows.
+
+    """
+    file_format = _get_file_format(path, file_format)
+    if file_format not in ["csv", "parquet"]:
+        raise AttributeError(
+            f"File format unknown. Please check the input arguement. We only support 'csv', 'parquet'. You passed {file_format}"
+        )
+
+    writer = None
+    n_rows = 0
+    try:
+        for i, df in enumerate(results):
+            if file_format == "csv":
+                df.to_csv(path, mode="w" if i == 0 else "a", header=i == 0)
+            else:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                table = pa.Table.from_pandas(df)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+            n_rows += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n_rows
+
+
+def _get_file_format(path, file_format):
+    """Infer the file format from the extension if not provided, and check it."""
+    if file_format is None:
+        file_format = os.path.splitext(path)[1].lstrip(".").lower()
+    if file_format not in FILE_FORMATS:
+        raise AttributeError(
+            f"File format unknown. Please check the input arguement. We only support 'csv', 'parquet', 'feather'. You passed {file_format}"
+        )
+    return file_format
+
+
+def _get_read_columns(columns, index_col):
+    """Columns to read from the file, including the index column."""
+    if columns is None:
+        return None
+    read_columns = list(columns)
+    if index_col is not None and index_col not in read_columns:
+        read_columns.append(index_col)
+    return read_columns
+
+
+def _get_file_columns(path, file_format):
+    """Names of the columns stored in a file, without reading its rows."""
+    file_format = _get_file_format(path, file_format)
+    if file_format == "csv":
+        return pd.read_csv(path, nrows=0).columns.tolist()
+    elif file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.read_schema(path).names
+    else:
+        import pyarrow as pa
+
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).schema.names
+
+
+def _iter_raw_chunks(path, file_format, chunksize, read_columns):
+    """Read a file in DataFrame chunks of about chunksize rows, see iter_staypoints()."""
+    if file_format == "csv":
+        yield from pd.read_csv(path, usecols=read_columns, chunksize=chunksize)
+    elif file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=read_columns):
+            yield batch.to_pandas()
+    else:
+        import pyarrow as pa
+
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if read_columns is not None:
+                    batch = batch.select(read_columns)
+                # record batches can be larger than chunksize, e.g., a single batch for the whole file
+                for offset in range(0, batch.num_rows, chunksize):
+                    yield batch.slice(offset, chunksize).to_pandas()
+
+
+def _check_contiguous_users(user_ids, previous_user):
+    """
+    Check that the users of a chunk are stored contiguously, and that the chunk does not continue the last user of the
+    previous chunk. Returns the last user of the chunk. Only the previous user is kept, such that the memory does not
+    grow with the number of users; a user reappearing after a later chunk is not detected.
+    """
+    user_ids = user_ids.values
+    n_runs = 1 + np.count_nonzero(user_ids[1:] != user_ids[:-1])
+    if n_runs != len(pd.unique(user_ids)) or user_ids[0] == previous_user:
+        raise AttributeError(
+            "Users are not stored contiguously. Please sort the staypoints by 'user_id' for reading them in chunks."
+        )
+    return user_ids[-1]
+
+
+def _prepare_staypoints(sp, index_col, geometry, categorical_ids, crs):
+    """Set index, encode ids and parse geometry of read staypoints, see read_staypoints()."""
+    # Parquet files written from a DataFrame with index restore it already
+    if index_col is not None and not (index_col not in sp.columns and sp.index.name == index_col):
+        sp = sp.set_index(index_col)
+
+    if categorical_ids:
+        sp = sp.assign(**{col: sp[col].astype("category") for col in ["user_id", "location_id"] if col in sp.columns})
+
+    if geometry:
+        sp = _to_geodataframe(sp, crs=crs)
+
+    return sp
+
+
+def _to_geodataframe(sp, crs):
+    """
+    Parse the geometry of staypoints in one vectorized call, see read_staypoints() for details.
+
+    Parameters
+    ----------
+    sp : DataFrame
+        Staypoints with column "geometry" (WKT or WKB), or columns "lng" and "lat".
+
+    crs: string
+        Coordinate reference system of the geometry.
+
+    Returns
+    -------
+    Geodataframe
+        The staypoints with geometry.
+
+    """
+    import geopandas as gpd
+
+    if "geometry" in sp.columns:
+        values = sp["geometry"].values
+        if len(values) and isinstance(values[0], (bytes, bytearray)):
+            geom = gpd.GeoSeries.from_wkb(values, index=sp.index, crs=crs)
+        else:
+            geom = gpd.GeoSeries.from_wkt(values, index=sp.index, crs=crs)
+        sp = sp.drop(columns="geometry")
+    elif "lng" in sp.columns and "lat" in sp.columns:
+        geom = gpd.GeoSeries(gpd.points_from_xy(sp["lng"].values, sp["lat"].values), index=sp.index, crs=crs)
+    else:
+        raise AttributeError("Geometry not found. The staypoints shall contain column 'geometry' or 'lng' and 'lat'.")
+
+    return gpd.GeoDataFrame(sp, geometry=geom, crs=crs)
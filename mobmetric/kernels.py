@@ -0,0 +1,121 @@
+import os
+from importlib.util import find_spec
+
+import numpy as np
+
+BACKENDS = ["numba", "numpy"]
+
+# numba is only imported once a compiled kernel is called, see mobmetric._numba_kernels
+HAS_NUMBA = find_spec("numba") is not None
+
+# the compiled kernels are used if numba is installed, unless disabled with the environment variable
+# MOBMETRIC_DISABLE_NUMBA=1 or set_backend("numpy")
+_backend = "numba" if HAS_NUMBA and os.environ.get("MOBMETRIC_DISABLE_NUMBA", "0") != "1" else "numpy"
+
+
+def set_backend(backend):
+    """
+    Select the backend of the per-user inner loops.
+
+    "numba" runs compiled kernels over flat arrays and user offsets in parallel threads (real entropy match search
+    and haversine distances of radius of gyration and jump length). "numpy" runs the pure Python/NumPy
+    implementation. Both return the same values (distances up to floating point rounding). The default is "numba"
+    if numba is installed.
+
+    Parameters
+    ----------
+    backend : string, {"numba", "numpy"}
+        The backend.
+
+    """
+    global _backend
+    if backend not in BACKENDS:
+        raise AttributeError(
+            f"Backend unknown. Please check the input arguement. We only support 'numba', 'numpy'. You passed {backend}"
+        )
+    if backend == "numba" and not HAS_NUMBA:
+        raise ImportError("The numba backend requires numba. Please install it with 'pip install numba'.")
+    _backend = backend
+
+
+def get_backend():
+    """
+    The selected backend, see set_backend().
+
+    Returns
+    -------
+    string
+        "numba" or "numpy".
+
+    """
+    return _backend
+
+
+def lambda_sums(loc_codes, offsets, n_jobs=-1):
+    """
+    Sum of the shortest unseen substring lengths of each user with the compiled kernel, see _lambda_sum_automaton().
+
+    Parameters
+    ----------
+    loc_codes : np.array
+        Integer location codes (-1 for missing locations), sorted by user.
+
+    offsets : np.array
+        Offsets of length n_users + 1, the locations of user k are loc_codes[offsets[k]:offsets[k + 1]].
+
+    n_jobs: int, default -1
+        Number of threads. Negative values count from the number of available threads as in joblib, i.e., all
+        threads if -1 and all but one if -2.
+
+    Returns
+    -------
+    np.array
+        The lambda sum of each user.
+
+    """
+    import numba
+
+    from mobmetric._numba_kernels import _lambda_sums_kernel
+
+    loc_codes = np.ascontiguousarray(loc_codes, dtype=np.int64) + 1
+    offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+    n_symbols = int(loc_codes.max()) + 1 if len(loc_codes) else 1
+    # longest users first, threads take the users one at a time
+    users = np.argsort(-np.diff(offsets), kind="stable")
+
+    if n_jobs == 0:
+        raise AttributeError("n_jobs == 0 has no meaning. Please pass a positive or negative number of threads.")
+    max_threads = numba.config.NUMBA_NUM_THREADS
+    n_threads = max(max_threads + 1 + n_jobs, 1) if n_jobs < 0 else min(n_jobs, max_threads)
+    prev_threads = numba.get_num_threads()
+    prev_chunksize = numba.set_parallel_chunksize(1)
+    numba.set_num_threads(n_threads)
+    try:
+        return _lambda_sums_kernel(loc_codes, offsets, users, n_symbols)
+    finally:
+        numba.set_num_threads(prev_threads)
+        numba.set_parallel_chunksize(prev_chunksize)
+
+
+def haversine_dist(lon_1, lat_1, lon_2, lat_2, r=6371000):
+    """
+    Element-wise haversine distances with the compiled kernel, identical to trackintel's haversine_dist().
+
+    Parameters
+    ----------
+    lon_1, lat_1, lon_2, lat_2 : np.array
+        Longitude and latitude of the first and second points.
+
+    r: float, default 6371000
+        Radius of the reference sphere.
+
+    Returns
+    -------
+    np.array
+        The distances in meters.
+
+    """
+    from mobmetric._numba_kernels import _haversine_kernel
+
+    arrays = [np.ascontiguousarray(values, dtype=np.float64).ravel() for values in (lon_1, lat_1, lon_2, lat_2)]
+    return _haversine_kernel(*arrays, float(r))
@@ -1,8 +1,14 @@
 import numpy as np
-from tqdm import tqdm
 import pandas as pd
 
-from trackintel.geogr.point_distances import haversine_dist
+from mobmetric import kernels
+from mobmetric.profiling import profile_stage
+from mobmetric.utils import _is_geodataframe
+from mobmetric.visits import VisitMatrix
+from mobmetric.distributions import LogHistogram
+
+# average earth radius in meters, as used by haversine_dist
+EARTH_RADIUS = 6371000
 
 
 def radius_gyration(sp, print_progress=False, method="count"):
@@ -11,11 +17,11 @@ def radius_gyration(sp, print_progress=False, method="count"):
 
     Parameters
     ----------
-    sp : Geodataframe
-        Staypoints with column "user_id" and geometry.
+    sp : Geodataframe, DataFrame or np.array
+        Staypoints with column "user_id" and coordinates, either as geometry, as float columns "lat" and "lng", or as projected float columns "x" and "y" (in meters). NumPy structured arrays with these fields are also accepted.
 
     print_progress: boolen, default False
-        Show per-user progress if set to True.
+        Not used, the calculation is vectorized over all users. Kept for compatibility.
 
     method: string, {"duration", "count"}, default "count"
         method to calculate rg. Duration additionally weights each sp with the activity duration.
@@ -30,37 +36,233 @@ def radius_gyration(sp, print_progress=False, method="count"):
     [1] Gonzalez, M. C., Hidalgo, C. A., & Barabasi, A. L. (2008). Understanding individual human mobility patterns. Nature, 453(7196), 779-782.
 
     """
-    if print_progress:
-        tqdm.pandas(desc="User radius of gyration calculation")
-        s = sp.groupby("user_id").progress_apply(lambda x: _radius_gyration_user(x, method))
+    if method not in ["duration", "count"]:
+        raise AttributeError(
+            f"Method unknown. Please check the input arguement. We only support 'duration', 'count'. You passed {method}"
+        )
+
+    # consecutive user codes, sorted as in groupby
+    with profile_stage("radius_gyration", "coordinates") as stage:
+        user_codes, users = pd.factorize(np.asarray(sp["user_id"]), sort=True)
+        xs, ys, planar = _get_coordinates(sp)
+
+        if method == "duration":
+            weights = np.asarray(sp["duration"], dtype=np.float64)
+        else:
+            weights = np.ones(len(sp), dtype=np.float64)
+        stage.rows = len(xs)
+
+    with profile_stage("radius_gyration", "gyration") as stage:
+        rg = _radius_gyration(user_codes, len(users), xs, ys, weights, planar)
+        stage.rows = len(rg)
+    return pd.Series(rg, index=pd.Index(users, name="user_id"), name="radiusGyration")
+
+
+def gyration_moments(sp, method="count"):
+    """
+    Mergeable moments of individual locations for incremental radius of gyration calculation.
+
+    The moments (weight sum, weighted mean and weighted sum of squared deviations of each coordinate) can be computed
+    on shards or on newly appended staypoints, combined with merge_gyration_moments(), and turned into the radius of
+    gyration with radius_gyration_from_moments().
+
+    Parameters
+    ----------
+    sp : Geodataframe, DataFrame or np.array
+        Staypoints with column "user_id" and coordinates, see radius_gyration().
+
+    method: string, {"duration", "count"}, default "count"
+        method to calculate rg. Duration additionally weights each sp with the activity duration.
+
+    Returns
+    -------
+    pandas DataFrame
+        Per-user moments indexed by "user_id", with columns "weight", "meanX", "meanY", "m2X" and "m2Y". X and Y are
+        the longitude and latitude (or projected x and y) coordinates, attrs["planar"] is True for projected
+        coordinates in meters.
+
+    """
+    if method not in ["duration", "count"]:
+        raise AttributeError(
+            f"Method unknown. Please check the input arguement. We only support 'duration', 'count'. You passed {method}"
+        )
+
+    user_codes, users = pd.factorize(np.asarray(sp["user_id"]), sort=True)
+    xs, ys, planar = _get_coordinates(sp)
+
+    if method == "duration":
+        weights = np.asarray(sp["duration"], dtype=np.float64)
     else:
-        s = sp.groupby("user_id").apply(lambda x: _radius_gyration_user(x, method))
+        weights = np.ones(len(user_codes), dtype=np.float64)
+
+    weight_sums = np.bincount(user_codes, weights=weights, minlength=len(users))
+    moments = pd.DataFrame({"weight": weight_sums}, index=pd.Index(users, name="user_id"))
+    for col, values in [("X", xs), ("Y", ys)]:
+        means = np.bincount(user_codes, weights=values * weights, minlength=len(users)) / weight_sums
+        moments[f"mean{col}"] = means
+        moments[f"m2{col}"] = np.bincount(
+            user_codes, weights=weights * (values - means[user_codes]) ** 2, minlength=len(users)
+        )
 
-    s.rename("radiusGyration", inplace=True)
-    return s
+    moments = moments[["weight", "meanX", "meanY", "m2X", "m2Y"]]
+    moments.attrs["planar"] = planar
+    return moments
 
 
-def jump_length(sp):
+def merge_gyration_moments(moments_ls):
     """
-    Jump length between consecutive locations.
+    Merge the moments of the same users computed on different staypoints, e.g., shards or appended days.
 
     Parameters
     ----------
-    sp : Geodataframe
-        Staypoints with geometry in latitude and longitude.
+    moments_ls : list
+        Moments DataFrames, see gyration_moments().
+
+    Returns
+    -------
+    pandas DataFrame
+        The merged per-user moments, identical (up to floating point) to the moments of all staypoints.
+
+    """
+    moments_ls = list(moments_ls)
+    planar = {_get_planar(moments) for moments in moments_ls}
+    if len(planar) > 1:
+        raise AttributeError(
+            "Moments of projected and of latitude and longitude coordinates cannot be merged. Please compute all "
+            "moments from the same coordinates."
+        )
+
+    df = pd.concat(moments_ls)
+    weight = df.groupby(level="user_id")["weight"].transform("sum")
+
+    merged = pd.DataFrame({"weight": df["weight"].groupby(level="user_id").sum()})
+    for col in ["X", "Y"]:
+        # parallel variance: the sum of squared deviations is corrected by the deviation of each part mean
+        mean = (df[f"mean{col}"] * df["weight"]).groupby(level="user_id").transform("sum") / weight
+        merged[f"mean{col}"] = mean.groupby(level="user_id").first()
+        merged[f"m2{col}"] = (
+            (df[f"m2{col}"] + df["weight"] * (df[f"mean{col}"] - mean) ** 2).groupby(level="user_id").sum()
+        )
+
+    merged = merged[["weight", "meanX", "meanY", "m2X", "m2Y"]]
+    merged.attrs["planar"] = planar.pop()
+    return merged
+
+
+def radius_gyration_from_moments(moments, sp=None, method="count"):
+    """
+    Radius of gyration from (merged) moments, see gyration_moments().
+
+    Parameters
+    ----------
+    moments : pandas DataFrame
+        Per-user moments, see gyration_moments(). Whether the moments are computed from projected coordinates in
+        meters is read from attrs["planar"].
+
+    sp: Geodataframe, DataFrame or np.array, default None
+        If provided, all staypoints of the users in moments, for the exact calculation with haversine distances to the
+        centers of mass of the moments. Otherwise, latitude and longitude moments are evaluated on the local tangent
+        plane at the center of mass of each user, which is accurate for radii that are small compared to the earth.
+
+    method: string, {"duration", "count"}, default "count"
+        method of the moments, only used for the exact calculation.
+
+    Returns
+    -------
+    pandas Series
+        the radius of gyration for individuals.
+
+    """
+    planar = _get_planar(moments)
+    if sp is not None:
+        user_codes = moments.index.get_indexer(np.asarray(sp["user_id"]))
+        if (user_codes < 0).any():
+            missing = pd.unique(np.asarray(sp["user_id"])[user_codes < 0])
+            raise AttributeError(
+                f"Users of sp are missing in moments. Please provide the staypoints of the users in moments only. "
+                f"Missing users: {', '.join(map(str, missing[:10]))}{', ...' if len(missing) > 10 else ''}"
+            )
+        xs, ys, sp_planar = _get_coordinates(sp)
+        if sp_planar != planar:
+            raise AttributeError(
+                "Coordinates of sp do not match the moments. Please provide sp with the coordinates of the moments."
+            )
+        weights = np.asarray(sp["duration"], dtype=np.float64) if method == "duration" else np.ones(len(xs))
+
+        center_xs, center_ys = moments["meanX"].values, moments["meanY"].values
+        sq_dists = _point_distances(xs, ys, center_xs[user_codes], center_ys[user_codes], planar) ** 2.0
+        rg = np.sqrt(np.bincount(user_codes, weights=weights * sq_dists, minlength=len(moments)) / moments["weight"])
+    elif planar:
+        rg = np.sqrt((moments["m2X"] + moments["m2Y"]) / moments["weight"])
+    else:
+        # squared distances on the tangent plane: latitude differences, and longitude differences scaled by cos(lat)
+        sq_rad = np.deg2rad(1) ** 2 * (moments["m2Y"] + np.cos(np.deg2rad(moments["meanY"])) ** 2 * moments["m2X"])
+        rg = EARTH_RADIUS * np.sqrt(sq_rad / moments["weight"])
+
+    return pd.Series(np.asarray(rg, dtype=np.float64), index=moments.index, name="radiusGyration")
+
+
+def _get_planar(moments):
+    """Whether the moments are computed from projected coordinates, see gyration_moments()."""
+    if "planar" not in moments.attrs:
+        raise AttributeError(
+            "Coordinates of the moments unknown. Please compute the moments with gyration_moments(), which stores "
+            "attrs['planar']."
+        )
+    return bool(moments.attrs["planar"])
+
+
+def jump_length(sp, by_day=False, grouped=False):
+    """
+    Jump length between consecutive locations of each user.
+
+    Parameters
+    ----------
+    sp : Geodataframe, DataFrame or np.array
+        Staypoints with column "user_id" and coordinates (see radius_gyration()), ordered in time per user.
+
+    by_day: boolen, default False
+        If True, only consider jumps between consecutive locations of the same day. Requires column "started_at".
+
+    grouped: boolen, default False
+        If True, additionally return the offsets and the users of the jumps, see Returns.
 
     Returns
     -------
     np.array
-        Array containing the jump lengths.
+        Array containing the jump lengths, grouped by user (sorted as in groupby). Jumps between different users (and days) are not considered.
+
+    np.array
+        Only if grouped is True. Offsets of length n_users + 1, the jumps of user k are jumps[offsets[k]:offsets[k + 1]].
+
+    pandas Index
+        Only if grouped is True. The "user_id" of each user.
 
     References
     ----------
     [1] Brockmann, D., Hufnagel, L., & Geisel, T. (2006). The scaling laws of human travel. Nature, 439(7075), 462-465.
 
     """
-    pts = sp.geometry.values
-    return np.array([haversine_dist(pts[i - 1].x, pts[i - 1].y, pts[i].x, pts[i].y)[0] for i in range(1, len(pts))])
+    # consecutive user codes, stable sort keeps the time order within each user
+    with profile_stage("jump_length", "coordinates") as stage:
+        user_codes, users = pd.factorize(np.asarray(sp["user_id"]), sort=True)
+        order = np.argsort(user_codes, kind="stable")
+        user_codes = user_codes[order]
+        xs, ys, planar = _get_coordinates(sp)
+        xs, ys = xs[order], ys[order]
+
+        days = pd.DatetimeIndex(sp["started_at"]).normalize().asi8[order] if by_day else None
+        stage.rows = len(xs)
+
+    with profile_stage("jump_length", "jumps") as stage:
+        jumps, is_jump = _jump_lengths(user_codes, xs, ys, planar, days=days)
+        stage.rows = len(jumps)
+
+    if grouped:
+        jump_counts = np.bincount(user_codes[1:][is_jump], minlength=len(users))
+        offsets = np.concatenate([[0], np.cumsum(jump_counts)])
+        return jumps, offsets, pd.Index(users, name="user_id")
+    return jumps
 
 
 def wait_time(df):
@@ -89,6 +291,54 @@ def wait_time(df):
         return ((df["finished_at"] - df["started_at"]).dt.total_seconds() / 3600).values
 
 
+def jump_length_histogram(sp, by_day=False, bins_per_decade=20):
+    """
+    Log-binned histogram of the jump lengths, see jump_length().
+
+    The histogram holds O(bins) memory, and histograms of chunks of complete users (e.g., from iter_staypoints()) or
+    of different workers are combined with merge_histograms() into the histogram of all jumps.
+
+    Parameters
+    ----------
+    sp : Geodataframe, DataFrame or np.array
+        Staypoints with column "user_id" and coordinates, see jump_length().
+
+    by_day: boolen, default False
+        If True, only consider jumps between consecutive locations of the same day.
+
+    bins_per_decade: int, default 20
+        Number of bins per factor of 10, see mobmetric.LogHistogram.
+
+    Returns
+    -------
+    LogHistogram
+        The histogram of the jump lengths in meters. Zero length jumps are counted in n_nonpositive.
+
+    """
+    return LogHistogram(bins_per_decade).update(jump_length(sp, by_day=by_day))
+
+
+def wait_time_histogram(df, bins_per_decade=20):
+    """
+    Log-binned histogram of the wait times, see wait_time() and jump_length_histogram().
+
+    Parameters
+    ----------
+    sp : DataFrame
+        Staypoints with time information, either provided in "duration" column, or in "finished_at" and "started_at" columns.
+
+    bins_per_decade: int, default 20
+        Number of bins per factor of 10, see mobmetric.LogHistogram.
+
+    Returns
+    -------
+    LogHistogram
+        The histogram of the wait times in hours.
+
+    """
+    return LogHistogram(bins_per_decade).update(wait_time(df))
+
+
 def location_frquency(sp):
     """Location visit frquency for datasets
 
@@ -108,56 +358,163 @@ def location_frquency(sp):
 
     """
 
-    # get visit times per user and location
-    freq = sp.groupby(["user_id", "location_id"], as_index=False).size()
-    # get the rank of locations per user
-    freq["visitRank"] = freq.groupby("user_id")["size"].rank(ascending=False, method="first")
-    # get the average visit freqency for every rank
-    pLoc = freq.groupby("visitRank")["size"].mean().values
+    # visit times per user and location, ranked per user and averaged for every rank, see VisitMatrix.rank_frequency()
+    return VisitMatrix.from_staypoints(sp).rank_frequency()
+
+
+def _radius_gyration(user_codes, n_users, xs, ys, weights, planar):
+    """
+    Radius of gyration from flat arrays, see radius_gyration() for details.
+
+    Parameters
+    ----------
+    user_codes : np.array
+        User code (0 to n_users - 1) of each staypoint.
+
+    n_users : int
+        The number of users.
+
+    xs, ys : np.array
+        Longitude (x) and latitude (y) of each staypoint.
+
+    weights : np.array
+        Weight of each staypoint, i.e., ones for method "count" and durations for method "duration".
+
+    planar: boolen
+        True if the coordinates are projected.
+
+    Returns
+    -------
+    np.array
+        The radius of gyration of each user.
 
-    # normalize
-    pLoc = pLoc / pLoc.sum()
+    """
+    # (weighted) center of mass of each user
+    weight_sums = np.bincount(user_codes, weights=weights, minlength=n_users)
+    center_xs = np.bincount(user_codes, weights=xs * weights, minlength=n_users) / weight_sums
+    center_ys = np.bincount(user_codes, weights=ys * weights, minlength=n_users) / weight_sums
 
-    return pLoc
+    # squared distance of each staypoint to the center of mass of its user
+    sq_dists = _point_distances(xs, ys, center_xs[user_codes], center_ys[user_codes], planar) ** 2.0
+    return np.sqrt(np.bincount(user_codes, weights=weights * sq_dists, minlength=n_users) / weight_sums)
 
 
-def _radius_gyration_user(sp_user, method):
+def _jump_lengths(user_codes, xs, ys, planar, days=None):
     """
-    User level radius of gyration calculation, see radius_gyration() for details.
+    Jump lengths from flat arrays sorted by user, see jump_length() for details.
 
     Parameters
     ----------
-    sp_user : Geodataframe
-        The staypoints from an individual, should contain "geometry".
+    user_codes : np.array
+        User code of each staypoint, sorted.
+
+    xs, ys : np.array
+        Longitude (x) and latitude (y) of each staypoint.
+
+    planar: boolen
+        True if the coordinates are projected.
+
+    days: np.array, default None
+        Day of each staypoint. If provided, jumps between different days are not considered.
 
-    method: string, {"duration", "count"}, default "count"
-        method to calculate rg. Duration additionally weights each sp with the activity duration.
     Returns
     -------
-    float
-        the radius of gyration of the individual
+    np.array
+        The jump lengths.
+
+    np.array
+        Boolean array of length n - 1, True if the staypoints i and i + 1 form a jump.
+
     """
-    sp_user["lat"] = sp_user["geometry"].y
-    sp_user["lng"] = sp_user["geometry"].x
-    lats_lngs = sp_user[["lat", "lng"]].values
+    # consecutive locations of the same user (and day)
+    is_jump = user_codes[1:] == user_codes[:-1]
+    if days is not None:
+        is_jump &= days[1:] == days[:-1]
 
-    if method == "duration":
-        durs = sp_user[["duration"]].values
-
-        center_of_mass = np.sum([lat_lng * dur for lat_lng, dur in zip(lats_lngs, durs)], axis=0) / np.sum(durs)
-        inside = [
-            dur * (haversine_dist(lng, lat, center_of_mass[-1], center_of_mass[0]) ** 2.0)
-            for (lat, lng), dur in zip(lats_lngs, durs)
-        ]
-
-        rg = np.sqrt(np.sum(inside) / sp_user["duration"].sum())
-    elif method == "count":
-        center_of_mass = np.mean(lats_lngs, axis=0)
-        rg = np.sqrt(
-            np.mean([haversine_dist(lng, lat, center_of_mass[-1], center_of_mass[0]) ** 2.0 for lat, lng in lats_lngs])
-        )
+    jumps = _point_distances(xs[:-1][is_jump], ys[:-1][is_jump], xs[1:][is_jump], ys[1:][is_jump], planar)
+    return jumps, is_jump
+
+
+def _get_coordinates(sp):
+    """
+    Extract the coordinates of staypoints as contiguous float64 arrays.
+
+    Parameters
+    ----------
+    sp : Geodataframe, DataFrame or np.array
+        Staypoints with geometry, columns "lat" and "lng", or projected columns "x" and "y".
+
+    Returns
+    -------
+    np.array
+        The longitudes or x coordinates.
+
+    np.array
+        The latitudes or y coordinates.
+
+    boolen
+        True if the coordinates are projected (planar), False if they are in latitude and longitude.
+
+    """
+    columns = sp.dtype.names if isinstance(sp, np.ndarray) else sp.columns
+
+    if _is_geodataframe(sp):
+        planar = sp.crs is not None and not sp.crs.is_geographic
+        return sp.geometry.x.to_numpy(dtype=np.float64), sp.geometry.y.to_numpy(dtype=np.float64), planar
+    elif "lat" in columns and "lng" in columns:
+        return np.asarray(sp["lng"], dtype=np.float64), np.asarray(sp["lat"], dtype=np.float64), False
+    elif "x" in columns and "y" in columns:
+        return np.asarray(sp["x"], dtype=np.float64), np.asarray(sp["y"], dtype=np.float64), True
     else:
         raise AttributeError(
-            f"Method unknown. Please check the input arguement. We only support 'duration', 'count'. You passed {method}"
+            "Coordinates not found. The staypoints shall contain geometry, columns 'lat' and 'lng', or columns 'x' and 'y'."
         )
-    return rg
+
+
+def _point_distances(x_1, y_1, x_2, y_2, planar):
+    """
+    Element-wise distances in meters, haversine for latitude and longitude and euclidean for projected coordinates.
+
+    Parameters
+    ----------
+    x_1, y_1, x_2, y_2 : np.array
+        Longitude (x) and latitude (y) of the first and second points.
+
+    planar: boolen
+        True if the coordinates are projected.
+
+    Returns
+    -------
+    np.array
+        The distances.
+
+    """
+    if planar:
+        return np.hypot(x_2 - x_1, y_2 - y_1)
+    if kernels.get_backend() == "numba":
+        return kernels.haversine_dist(x_1, y_1, x_2, y_2, r=EARTH_RADIUS)
+    return _haversine_dist(x_1, y_1, x_2, y_2)
+
+
+def _haversine_dist(lon_1, lat_1, lon_2, lat_2, r=EARTH_RADIUS):
+    """
+    Element-wise haversine distances in meters with NumPy, identical to trackintel's haversine_dist().
+
+    Parameters
+    ----------
+    lon_1, lat_1, lon_2, lat_2 : np.array
+        Longitude and latitude of the first and second points.
+
+    r: float, default EARTH_RADIUS
+        Radius of the reference sphere.
+
+    Returns
+    -------
+    np.array
+        The distances.
+
+    """
+    lon_1, lat_1, lon_2, lat_2 = (np.deg2rad(values).ravel() for values in (lon_1, lat_1, lon_2, lat_2))
+    cos_lat_d = np.cos(lat_1 - lat_2)
+    cos_lon_d = np.cos(lon_1 - lon_2)
+    return r * np.arccos(cos_lat_d - np.cos(lat_1) * np.cos(lat_2) * (1 - cos_lon_d))
@@ -1,15 +1,20 @@
 import numpy as np
 import pandas as pd
 
-from networkx.algorithms import isomorphism
-import networkx as nx
+import itertools
+import os
+from functools import lru_cache
 
-from trackintel.analysis.tracking_quality import _split_overlaps
+from mobmetric.profiling import profile_stage
+from mobmetric.utils import _relative_time_ns
 
-from tqdm import tqdm
+# catalogue of all possible motifs, generated with mobmetric/scripts/build_motif_catalogue.py
+MOTIF_CATALOGUE_PATH = os.path.join(os.path.dirname(__file__), "data", "motif_catalogue.npz")
 
+NS_PER_DAY = 24 * 60 * 60 * 10**9
 
-def mobility_motifs(sp, proportion_filter=0.005):
+
+def mobility_motifs(sp, proportion_filter=0.005, start_time="2023-01-01 08:00:00"):
     """
     Get the mobility motifs for a input dataset (sp).
 
@@ -19,16 +24,19 @@ def mobility_motifs(sp, proportion_filter=0.005):
 
     Parameters
     ----------
-    sp : Geodataframe
-        Staypoints with user and time information ("user_id", "started_at", "finished_at"), and "location_id".
+    sp : Geodataframe or DataFrame
+        Staypoints with user and time information ("user_id", "started_at", "finished_at", or "duration" in relative time format), and "location_id". Staypoints spanning midnight are split into one visit per (local) day.
 
     proportion_filter: boolen, default 0.005
         Filter to control how frequent a pattern coulf be considered a motifs, e.g., 0.005 means patterns occuring more than 0.5% of all the patterns are considered motifs.
 
+    start_time: str or datetime, default "2023-01-01 08:00:00"
+        Start time of each user for staypoints in relative time format, i.e., without "started_at" but with "duration" (in hours) of consecutive staypoints (e.g., obtained directly from mobility simulation). See relative_to_absolute_time().
+
     Returns
     -------
     pandas DataFrame
-        User day dataframe containing the motifs information with columns "visits", "uniq_visits", and "class". "visits" and "uniq_visits" represent the number of locations and number of unique location visits during the day, repectively. "class" is the unique type of motifs of the day. "uniq_visits" and "class" together uniquely define a motif. Non motif days receive NaN value.
+        User day dataframe ("user_id", "date") containing the motifs information with columns "visits", "uniq_visits", "class" and "motif_id". "visits" and "uniq_visits" represent the number of locations and number of unique location visits during the day, repectively. "class" is the canonical adjacency code of the motif of the day (see _canonical_code()). "uniq_visits" and "class" together uniquely define a motif, which is also identified by the stable "motif_id" from motif_catalogue() that can be compared across datasets. Non motif days receive NaN value.
 
     References
     ----------
@@ -36,155 +44,489 @@ def mobility_motifs(sp, proportion_filter=0.005):
 
     """
     # split the records based on day, such that daily motifs can be constructed
-    sp = _split_overlaps(sp, granularity="day")
-    sp["date"] = sp["started_at"].dt.date
-
-    # delete the self transitions within the same day (no required for generated sequences)
-    sp["loc_next"] = sp["location_id"].shift(-1)
-    sp["date_next"] = sp["date"].shift(-1)
-
-    sp = sp.loc[~((sp["loc_next"] == sp["location_id"]) & (sp["date_next"] == sp["date"]))].copy()
-    sp.drop(columns=["loc_next", "date_next"], inplace=True)
-
-    # count unique daily location visits, and merge back to sp
-    user_date_loc_count = sp.groupby(["user_id", "date"]).agg({"location_id": "nunique"})
-    user_date_loc_count.rename(columns={"location_id": "uniq_visits"}, inplace=True)
-    sp = sp.merge(user_date_loc_count.reset_index(), on=["user_id", "date"], how="left")
+    with profile_stage("mobility_motifs", "split_days") as stage:
+        user_codes, _ = pd.factorize(sp["user_id"].values)
+        if "started_at" in sp.columns:
+            started_at, finished_at = _wall_time_ns(sp["started_at"]), _wall_time_ns(sp["finished_at"])
+        else:
+            # relative time format, the offsets are added to the start time without constructing datetimes
+            started_at, finished_at = _relative_time_ns(sp["user_id"].values, sp["duration"].values)
+            start_time = _wall_time_ns([pd.Timestamp(start_time)])[0]
+            started_at, finished_at = started_at + start_time, finished_at + start_time
+        order = np.lexsort((started_at, user_codes))
+        rows, days = _split_days(started_at[order], finished_at[order])
+        rows = order[rows]
+        stage.rows = len(rows)
+
+    # delete the self transitions within the same user day
+    with profile_stage("mobility_motifs", "self_transitions") as stage:
+        user_codes = user_codes[rows]
+        loc_codes = pd.factorize(sp["location_id"].values[rows])[0]
+        is_self_transition = np.zeros(len(rows), dtype=bool)
+        is_self_transition[:-1] = (
+            (user_codes[:-1] == user_codes[1:]) & (days[:-1] == days[1:]) & (loc_codes[:-1] == loc_codes[1:])
+        )
+        rows, days = rows[~is_self_transition], days[~is_self_transition]
+
+        sp = pd.DataFrame(
+            {"user_id": sp["user_id"].values[rows], "date": days, "location_id": sp["location_id"].values[rows]}
+        )
+        stage.rows = len(sp)
 
     # construct possible graphs
     user_day_df = _get_user_day_graph(sp)
 
-    # get total number of graphs for filtering
-    total_graphs = len(user_day_df)
-
-    def _get_valid_motifs(df):
-        if (len(df) / total_graphs) > proportion_filter:
-            return df
+    with profile_stage("mobility_motifs", "filter") as stage:
+        # get total number of graphs for filtering
+        total_graphs = len(user_day_df)
 
-    # get the valid motifs per user days
-    motifs_user_days = (
-        user_day_df.groupby(["uniq_visits", "class"], as_index=False).apply(_get_valid_motifs).reset_index(drop=True)
-    )
+        # get the valid motifs per user days
+        pattern_count = user_day_df.groupby(["uniq_visits", "class"])["user_id"].transform("size")
+        motifs_user_days = user_day_df.loc[(pattern_count / total_graphs) > proportion_filter].reset_index(drop=True)
+        stage.rows = len(motifs_user_days)
 
     # merge back to all user days
-    return_df = (
-        sp.groupby(["user_id", "date"])
-        .size()
-        .rename("visits")
-        .reset_index()
-        .merge(motifs_user_days, on=["user_id", "date"], how="left")
-    )
+    with profile_stage("mobility_motifs", "merge") as stage:
+        return_df = (
+            sp.groupby(["user_id", "date"])
+            .size()
+            .rename("visits")
+            .reset_index()
+            .merge(motifs_user_days, on=["user_id", "date"], how="left")
+        )
+        # day numbers to dates
+        return_df["date"] = return_df["date"].values.astype("datetime64[D]").astype("datetime64[ns]")
+        stage.rows = len(return_df)
 
     return return_df
 
 
+def _wall_time_ns(times):
+    """
+    Local wall time of timestamps as int64 nanoseconds, such that day borders are multiples of a day.
+
+    Parameters
+    ----------
+    times : pandas Series
+        Timestamps, timezone aware or naive.
+
+    Returns
+    -------
+    np.array
+        The local wall time in nanoseconds since epoch.
+
+    """
+    times = pd.DatetimeIndex(times)
+    if times.tz is not None:
+        times = times.tz_localize(None)
+    return times.values.astype("datetime64[ns]").view(np.int64)
+
+
+def _split_days(started_at, finished_at):
+    """
+    Split records that span several days into one record per day.
+
+    A record from started_at to finished_at is split at every midnight in between. A record that finishes exactly at
+    midnight does not create an empty record on the next day, and records without duration are kept.
+
+    Parameters
+    ----------
+    started_at : np.array
+        Start times as int64 nanoseconds, see _wall_time_ns().
+
+    finished_at : np.array
+        Finish times as int64 nanoseconds.
+
+    Returns
+    -------
+    np.array
+        Index of the original record of each split record.
+
+    np.array
+        Day number (days since epoch) of each split record.
+
+    """
+    first_days = started_at // NS_PER_DAY
+    last_days = finished_at // NS_PER_DAY
+    # finishing at midnight belongs to the previous day
+    ends_at_midnight = (finished_at % NS_PER_DAY == 0) & (finished_at > started_at)
+    last_days = np.maximum(last_days - ends_at_midnight, first_days)
+
+    n_days = last_days - first_days + 1
+    rows = np.repeat(np.arange(len(started_at)), n_days)
+    # position of each split record within its original record
+    offsets = np.cumsum(n_days) - n_days
+    days = first_days[rows] + np.arange(len(rows)) - offsets[rows]
+    return rows, days
+
+
 def _get_user_day_graph(sp):
     """
     Construct network patterns from user daily location visits. The return of the function can be used to filter for motifs.
 
+    Day graphs are constructed as adjacency bitmasks for all user days at once: locations are relabeled per day in the
+    order of their first visit, and each transition sets the bit of its (from, to) pair, see _adjacency_code().
+
     Parameters
     ----------
     sp : Geodataframe
-        Staypoints with columns "user_id", "date", "uniq_visits" and "location_id".
+        Staypoints with columns "user_id", "date" and "location_id", ordered in time per user.
 
     Returns
     -------
     pandas DataFrame
-        User day dataframe containing the network pattern information with columns "uniq_visits", "class". "uniq_visits" represents the number of unique location visits during the day. "class" is the unique type of network pattern of the day. "uniq_visits" and "class" together uniquely define a pattern. Non pattern days receive NaN value.
+        User day dataframe containing the network pattern information with columns "uniq_visits", "class" and "motif_id". "uniq_visits" represents the number of unique location visits during the day. "class" is the canonical adjacency code of the network pattern of the day, i.e., the minimum adjacency bitmask over all node permutations, which is identical for isomorphic patterns and stable across runs and datasets. "uniq_visits" and "class" together uniquely define a pattern, which is also identified by the stable "motif_id" from motif_catalogue(). Non pattern days receive NaN value.
 
     References
     ----------
     [1] Schneider, C. M., Belik, V., Couronné, T., Smoreda, Z., & González, M. C. (2013). Unravelling daily human mobility motifs. Journal of The Royal Society Interface, 10(84), 20130246.
 
     """
+    with profile_stage("mobility_motifs", "relabel_locations") as stage:
+        # group the visits by user day, stable sort keeps the time order within each day
+        day_codes = sp.groupby(["user_id", "date"], sort=False).ngroup().values
+        order = np.argsort(day_codes, kind="stable")
+        day_codes = day_codes[order]
+        loc_codes, locs = pd.factorize(sp["location_id"].values[order])
+        n_days = day_codes[-1] + 1 if len(day_codes) else 0
+
+        # relabel the locations of each day in the order of their first visit
+        pair_keys, first_visits, pair_inverse = np.unique(
+            day_codes.astype(np.int64) * len(locs) + loc_codes, return_index=True, return_inverse=True
+        )
+        pair_days = pair_keys // len(locs)
+        pair_order = np.argsort(first_visits, kind="stable")
+        sorted_pair_days = pair_days[pair_order]
+        pair_nodes = np.empty(len(pair_keys), dtype=np.int64)
+        pair_nodes[pair_order] = np.arange(len(pair_keys)) - np.searchsorted(sorted_pair_days, sorted_pair_days)
+        nodes = pair_nodes[pair_inverse.ravel()]
+
+        uniq_visits = np.bincount(pair_days, minlength=n_days)
+        edge_num = np.bincount(day_codes, minlength=n_days) - 1
+        stage.rows = n_days
+
+    with profile_stage("mobility_motifs", "adjacency_codes") as stage:
+        # transitions within the same day, considering up to 6 location visits per day
+        is_edge = day_codes[1:] == day_codes[:-1]
+        is_edge &= uniq_visits[day_codes[1:]] <= 6
+        edge_days, src, dst = day_codes[1:][is_edge], nodes[:-1][is_edge], nodes[1:][is_edge]
+
+        codes = np.zeros(n_days, dtype=np.int64)
+        np.bitwise_or.at(codes, edge_days, np.left_shift(np.int64(1), src * uniq_visits[edge_days] + dst))
 
-    user_day_ls = []
-
-    # consider up to 6 location visits per day
-    for uniq_visits in tqdm(range(1, 7)):
-        curr_sp = sp.loc[sp["uniq_visits"] == uniq_visits].copy()
-        curr_sp["next_loc"] = curr_sp["location_id"].shift(-1)
+        # valid motifs shall be connected: each node shall have in and our degree
+        out_nodes = np.zeros(n_days, dtype=np.int64)
+        in_nodes = np.zeros(n_days, dtype=np.int64)
+        np.bitwise_or.at(out_nodes, edge_days, np.left_shift(np.int64(1), src))
+        np.bitwise_or.at(in_nodes, edge_days, np.left_shift(np.int64(1), dst))
+        all_nodes = np.left_shift(np.int64(1), np.minimum(uniq_visits, 6)) - 1
+        has_degree = (out_nodes == all_nodes) & (in_nodes == all_nodes)
 
         # for only 1 location visit, every day is the same motif
-        if uniq_visits == 1:
-            graph_s = curr_sp.groupby(["user_id", "date"]).size().rename("class").reset_index()
-            graph_s["class"] = 0
-            graph_s["uniq_visits"] = uniq_visits
-            user_day_ls.append(graph_s)
-            continue
-
-        # the edge number shall be at least the node number, otherwise not a motif
-        edge_num = curr_sp.groupby(["user_id", "date"]).size() - 1
-        valid_user_dates = edge_num[edge_num >= uniq_visits].rename("edge_num")
-        curr_sp = curr_sp.merge(valid_user_dates.reset_index(), on=["user_id", "date"], how="left")
-        curr_sp = curr_sp.loc[~curr_sp["edge_num"].isna()]
-
-        # for 2 location visits, every day that have the edge number larger than the node number is the same motif
-        if uniq_visits == 2:
-            graph_s = curr_sp.groupby(["user_id", "date"]).size().rename("class").reset_index()
-            graph_s["class"] = 0
-            graph_s["uniq_visits"] = uniq_visits
-            user_day_ls.append(graph_s)
-            continue
-
-        graph_s = curr_sp.groupby(["user_id", "date"]).apply(_construct_day_graph)
-        # valid motifs shall be connected: each node shall have in and our degree
-        # filter graphs that do not have an in-degree and out degree
-        graph_s = graph_s.loc[~graph_s.isna()]
+        # otherwise the edge number shall be at least the node number
+        is_valid = (uniq_visits == 1) | ((uniq_visits <= 6) & (edge_num >= uniq_visits) & has_degree)
+        stage.rows = int(is_valid.sum())
+
+    with profile_stage("mobility_motifs", "canonical_codes") as stage:
+        # label motif class with the canonical code of the graph: isomorphic graphs share the same code
+        classes = np.zeros(n_days, dtype=np.int64)
+        for n in range(1, 7):
+            is_curr = is_valid & (uniq_visits == n)
+            curr_codes, inverse = np.unique(codes[is_curr], return_inverse=True)
+            classes[is_curr] = _canonical_codes(n, curr_codes)[inverse.ravel()]
+        stage.rows = int(is_valid.sum())
+
+    with profile_stage("mobility_motifs", "motif_ids") as stage:
+        day_first_rows = np.searchsorted(day_codes, np.arange(n_days))[is_valid]
+        user_day_df = pd.DataFrame(
+            {
+                "user_id": sp["user_id"].values[order][day_first_rows],
+                "date": sp["date"].values[order][day_first_rows],
+                "class": classes[is_valid],
+                "uniq_visits": uniq_visits[is_valid],
+            }
+        )
+        user_day_df["motif_id"] = _get_motif_ids(user_day_df["uniq_visits"].values, user_day_df["class"].values)
+        stage.rows = len(user_day_df)
+
+    return user_day_df
+
+
+def _day_graph_to_networkx(uniq_visits, code):
+    """
+    Construct a networkx graph from an adjacency bitmask, e.g., to inspect motifs.
+
+    Parameters
+    ----------
+    uniq_visits : int
+        The number of nodes.
+
+    code : int
+        The adjacency bitmask of the graph, e.g., the "class" of a motif, see _adjacency_code().
 
-        # check for motif groups
-        unique_motif_group_ls = []
-        for i in range(len(graph_s) - 1):
-            # if i has already been check, we do not need to check again
-            if i in [item for sublist in unique_motif_group_ls for item in sublist]:
-                continue
+    Returns
+    -------
+    networkx DiGraph
+        Graph object with nodes 0 to uniq_visits - 1.
 
-            # check for repeated patterns as i in [i+1, max)
-            possible_match_ls = [i]
-            for j in range(i + 1, len(graph_s)):
-                if isomorphism.GraphMatcher(graph_s.iloc[i], graph_s.iloc[j]).is_isomorphic():
-                    possible_match_ls.append(j)
+    """
+    import networkx as nx
 
-            # append this group of motif
-            unique_motif_group_ls.append(possible_match_ls)
+    adjacency = ((int(code) >> np.arange(uniq_visits * uniq_visits)) & 1).reshape(uniq_visits, uniq_visits)
+    return nx.from_numpy_array(adjacency, create_using=nx.DiGraph)
 
-        # label motif class and assign back to graph_s
-        graph_s = graph_s.rename("graphs").reset_index()
-        class_arr = np.zeros(len(graph_s))
-        for i, classes in enumerate(unique_motif_group_ls):
-            class_arr[classes] = i
-        graph_s["class"] = class_arr
-        graph_s["class"] = graph_s["class"].astype(int)
-        graph_s["uniq_visits"] = uniq_visits
-        graph_s.drop(columns={"graphs"}, inplace=True)
 
-        user_day_ls.append(graph_s)
+def _adjacency_code(adjacency):
+    """
+    Encode an adjacency matrix as a bitmask, where entry (row, col) of a n x n matrix is stored at bit row * n + col.
 
-    return pd.concat(user_day_ls)
+    Parameters
+    ----------
+    adjacency : np.array
+        Square adjacency matrix, or stacked square adjacency matrices of shape (m, n, n).
 
+    Returns
+    -------
+    int or np.array
+        The adjacency bitmask(s).
 
-def _construct_day_graph(df):
     """
-    Construct networks from daily location visits. Shall be used after groupby ["user_id", "date"].
+    n = adjacency.shape[-1]
+    weights = np.left_shift(np.int64(1), np.arange(n * n, dtype=np.int64)).reshape(n, n)
+    return ((adjacency != 0) * weights).sum(axis=(-2, -1))
+
+
+@lru_cache(maxsize=None)
+def _canonical_code(n, code):
+    """
+    Canonical form of a directed graph: the minimum adjacency bitmask over all node permutations.
+
+    Isomorphic graphs share the same canonical code, thus motifs can be classified by grouping on the code instead of
+    pairwise isomorphism checks. Results are cached, as day graphs are often identical already before relabeling.
 
     Parameters
     ----------
-    df : Geodataframe
-        Staypoints with columns "location_id" and "next_loc".
+    n : int
+        The number of nodes, at most 6 to keep the permutations (n!) tractable.
+
+    code : int
+        The adjacency bitmask of the graph, see _adjacency_code().
 
     Returns
     -------
-    networkx DiGraph
-        Graph object constructed from location visits.
+    int
+        The canonical adjacency code.
+
+    """
+    return int(_canonical_codes(n, np.array([code], dtype=np.int64))[0])
+
+
+def _canonical_codes(n, codes, chunk_size=20000):
+    """
+    Vectorized _canonical_code() for many graphs with the same number of nodes.
+
+    Parameters
+    ----------
+    n : int
+        The number of nodes of all graphs.
+
+    codes : np.array
+        The adjacency bitmasks of the graphs, see _adjacency_code().
+
+    chunk_size: int, default 20000
+        Number of graphs processed at once, bounds the memory to n! * chunk_size codes.
+
+    Returns
+    -------
+    np.array
+        The canonical adjacency codes.
+
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    row_tables = _get_permutation_row_tables(n)
+    row_mask = (1 << n) - 1
+
+    canonical = np.empty(len(codes), dtype=np.int64)
+    for start in range(0, len(codes), chunk_size):
+        curr_codes = codes[start : start + chunk_size]
+
+        # permuted codes of all permutations (rows) and graphs (columns), composed row by row of the adjacency matrix
+        permuted = np.zeros((row_tables.shape[0], len(curr_codes)), dtype=np.int64)
+        for row in range(n):
+            permuted |= row_tables[:, row, (curr_codes >> (row * n)) & row_mask]
+
+        canonical[start : start + chunk_size] = permuted.min(axis=0)
+    return canonical
+
+
+@lru_cache(maxsize=None)
+def _get_permutation_row_tables(n):
+    """
+    Lookup tables to permute adjacency bitmasks of n nodes.
+
+    Returns an array of shape (n!, n, 2^n): entry [p, row, bits] is the contribution of the adjacency matrix row "row"
+    with column bits "bits" to the bitmask of the graph relabeled with permutation p.
+    """
+    perms = np.array(list(itertools.permutations(range(n))), dtype=np.int64).reshape(-1, n)
+    # position of each original node after relabeling
+    inv_perms = np.argsort(perms, axis=1)
+
+    # bit position of (row, col) after relabeling, shape (n!, n, n)
+    shifts = inv_perms[:, :, None] * n + inv_perms[:, None, :]
+    # column bits of all possible rows, shape (2^n, n)
+    row_bits = (np.arange(1 << n, dtype=np.int64)[:, None] >> np.arange(n)) & 1
+
+    return (row_bits[None, None, :, :] << shifts[:, :, None, :]).sum(axis=-1)
+
+
+def motif_catalogue():
+    """
+    Catalogue of all possible mobility motifs, i.e., connected directed graphs with 1 to 6 nodes where every node has an in-degree and out-degree (a single node for 1 location visit).
+
+    Returns
+    -------
+    pandas DataFrame
+        Motif catalogue with columns "motif_id", "uniq_visits" and "class". "motif_id" is the stable global identifier of the motif, "uniq_visits" the number of nodes and "class" the canonical adjacency code of the motif (see _canonical_code()). Motifs are sorted by "uniq_visits" and "class".
+
+    """
+    return _load_motif_catalogue().copy()
+
+
+@lru_cache(maxsize=None)
+def _load_motif_catalogue():
+    """Load the shipped motif catalogue, see motif_catalogue()."""
+    with np.load(MOTIF_CATALOGUE_PATH) as catalogue:
+        # codes are stored sorted and delta encoded per number of nodes
+        codes_ls = [np.cumsum(catalogue[f"codes_{n}"]) for n in range(1, 7)]
+
+    df = pd.DataFrame(
+        {
+            "uniq_visits": np.repeat(np.arange(1, 7), [len(codes) for codes in codes_ls]),
+            "class": np.concatenate(codes_ls),
+        }
+    )
+    df.index.name = "motif_id"
+    return df.reset_index()
+
+
+@lru_cache(maxsize=None)
+def _get_motif_catalogue_index():
+    """Hash index of the motif catalogue on the packed ("uniq_visits", "class") key, see _get_motif_ids()."""
+    df = _load_motif_catalogue()
+    return pd.Index(_pack_motif_key(df["uniq_visits"].values, df["class"].values))
+
+
+def _pack_motif_key(uniq_visits, classes):
+    """Pack number of nodes and canonical code (at most 36 bits) into one int64 key."""
+    return (np.asarray(uniq_visits, dtype=np.int64) << 36) | np.asarray(classes, dtype=np.int64)
+
+
+def _get_motif_ids(uniq_visits, classes):
+    """
+    Look up the stable motif ids in the motif catalogue.
+
+    Parameters
+    ----------
+    uniq_visits : np.array
+        Number of nodes of the graphs.
+
+    classes : np.array
+        Canonical adjacency codes of the graphs.
+
+    Returns
+    -------
+    np.array
+        The "motif_id" of each graph, -1 for graphs that are not in the catalogue.
+
+    """
+    return _get_motif_catalogue_index().get_indexer(_pack_motif_key(uniq_visits, classes))
+
+
+def _build_motif_catalogue(max_nodes=6):
+    """
+    Enumerate the canonical codes of all possible motifs, see motif_catalogue().
+
+    Graphs with n nodes are generated by adding a node with all possible in and out edges to every graph with n - 1
+    nodes, and deduplicated by canonical code. Takes several minutes for 6 nodes.
+
+    Parameters
+    ----------
+    max_nodes : int, default 6
+        Maximum number of nodes.
+
+    Returns
+    -------
+    dict
+        Sorted canonical codes of the motifs for each number of nodes.
 
     """
-    G = nx.DiGraph()
-    G.add_nodes_from(df["location_id"])
+    # all directed graphs (without self loops) with n - 1 nodes
+    graphs = np.zeros(1, dtype=np.int64)
+    catalogue = {1: graphs}
 
-    G.add_edges_from(df.iloc[:-1][["location_id", "next_loc"]].astype(int).values)
+    for n in range(2, max_nodes + 1):
+        prev_n = n - 1
 
-    in_degree = np.all([False if degree == 0 else True for _, degree in G.in_degree])
-    out_degree = np.all([False if degree == 0 else True for _, degree in G.out_degree])
-    # TODO: check the requirement in the original paper
-    if in_degree and out_degree:
-        return G
+        # embed the bitmasks of the n - 1 node graphs into n x n adjacency matrices
+        rows, cols = np.divmod(np.arange(prev_n * prev_n), prev_n)
+        embedded = np.zeros(len(graphs), dtype=np.int64)
+        for bit, (row, col) in enumerate(zip(rows, cols)):
+            embedded |= ((graphs >> bit) & 1) << (row * n + col)
+
+        # all combinations of out and in edges of the new node
+        new_bits = np.array([prev_n * n + i for i in range(prev_n)] + [i * n + prev_n for i in range(prev_n)])
+        combinations = (np.arange(1 << len(new_bits), dtype=np.int64)[:, None] >> np.arange(len(new_bits))) & 1
+        new_edges = combinations @ (np.int64(1) << new_bits)
+
+        candidates = (embedded[:, None] | new_edges[None, :]).ravel()
+        if n == max_nodes:
+            # the last level is only used for the catalogue, filter before the expensive canonicalization
+            candidates = candidates[_is_valid_motif(n, candidates)]
+
+        graphs = np.unique(_canonical_codes(n, candidates))
+        catalogue[n] = graphs[_is_valid_motif(n, graphs)]
+
+    return catalogue
+
+
+def _is_valid_motif(n, codes, chunk_size=200000):
+    """
+    Check whether graphs are valid motifs: weakly connected, and every node has an in-degree and out-degree.
+
+    Parameters
+    ----------
+    n : int
+        The number of nodes of all graphs.
+
+    codes : np.array
+        The adjacency bitmasks of the graphs, see _adjacency_code().
+
+    chunk_size: int, default 200000
+        Number of graphs processed at once.
+
+    Returns
+    -------
+    np.array
+        Boolean array, True for valid motifs.
+
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    if n == 1:
+        return codes == 0
+
+    valid = np.empty(len(codes), dtype=bool)
+    for start in range(0, len(codes), chunk_size):
+        curr_codes = codes[start : start + chunk_size]
+        adjacency = ((curr_codes[:, None] >> np.arange(n * n)) & 1).reshape(-1, n, n).astype(bool)
+
+        has_degree = adjacency.any(axis=2).all(axis=1) & adjacency.any(axis=1).all(axis=1)
+
+        # nodes reachable from the first node, ignoring edge directions
+        undirected = adjacency | adjacency.transpose(0, 2, 1)
+        reached = np.zeros((len(curr_codes), n), dtype=bool)
+        reached[:, 0] = True
+        for _ in range(n - 1):
+            reached |= np.einsum("gi,gij->gj", reached, undirected)
+
+        valid[start : start + chunk_size] = has_degree & reached.all(axis=1)
+    return valid
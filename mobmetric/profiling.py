@@ -0,0 +1,165 @@
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+logger = logging.getLogger("mobmetric")
+
+# stack of the active reports (innermost last), stages are recorded to the innermost report
+_active_reports = []
+
+
+@contextmanager
+def profile(memory=True, log=False):
+    """
+    Record the wall time, row count and peak memory of each pipeline stage within the context.
+
+    Stages are recorded for mobility_motifs(), real_entropy(), radius_gyration(), jump_length() and compute_metrics().
+    Without an active profile, the stages are not measured.
+
+    Parameters
+    ----------
+    memory: boolen, default True
+        Trace the peak memory of each stage with tracemalloc, which slows down the calculation. Memory allocated by
+        worker processes (e.g., real_entropy() with n_jobs != 1) is not traced.
+
+    log: boolen, default False
+        Log each stage at INFO level to the "mobmetric" logger.
+
+    Yields
+    ------
+    ProfileReport
+        The report, filled while the context is active.
+
+    Examples
+    --------
+    >>> with profile() as report:
+    ...     mobility_motifs(sp)
+    >>> report.to_frame()
+
+    """
+    report = ProfileReport(memory=memory, log=log)
+    start_tracing = memory and not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    _active_reports.append(report)
+    try:
+        yield report
+    finally:
+        _active_reports.remove(report)
+        if start_tracing:
+            tracemalloc.stop()
+
+
+class ProfileReport:
+    """Stages recorded by profile(), in the order of their completion."""
+
+    def __init__(self, memory=True, log=False):
+        self.memory = memory
+        self.log = log
+        self.records = []
+
+    def add(self, function, stage, time_s, rows=None, peak_mb=None):
+        """Add a stage record, and log it if requested."""
+        self.records.append(
+            {"function": function, "stage": stage, "time_s": time_s, "rows": rows, "peak_mb": peak_mb}
+        )
+        if self.log:
+            logger.info(
+                f"{function}.{stage}: {time_s:.4f}s"
+                + ("" if rows is None else f", {rows} rows")
+                + ("" if peak_mb is None else f", {peak_mb:.1f}MB peak")
+            )
+
+    def to_frame(self):
+        """
+        The report as DataFrame.
+
+        Returns
+        -------
+        pandas DataFrame
+            One row per stage with columns "function", "stage", "time_s" (wall time in seconds), "rows" (number of
+            rows produced by the stage) and "peak_mb" (peak traced memory during the stage above the memory at its
+            start, in MB).
+
+        """
+        return pd.DataFrame(self.records, columns=["function", "stage", "time_s", "rows", "peak_mb"])
+
+    def __len__(self):
+        return len(self.records)
+
+    def __repr__(self):
+        return self.to_frame().to_string()
+
+
+def profile_stage(function, stage):
+    """
+    Context manager measuring a pipeline stage if a profile is active, see profile().
+
+    Set the "rows" attribute of the returned stage to record the number of rows produced by the stage.
+
+    Parameters
+    ----------
+    function : str
+        Name of the profiled function.
+
+    stage : str
+        Name of the stage.
+
+    Returns
+    -------
+    _Stage
+        The stage context manager.
+
+    """
+    return _Stage(function, stage)
+
+
+# stack of the stages measured with tracemalloc, to pass the peak memory of nested stages to their parents
+_memory_stages = []
+
+
+class _Stage:
+    """A pipeline stage measured by profile_stage()."""
+
+    def __init__(self, function, stage):
+        self.function = function
+        self.stage = stage
+        self.rows = None
+        self.report = None
+
+    def __enter__(self):
+        if not _active_reports:
+            return self
+        self.report = _active_reports[-1]
+
+        self.trace_memory = self.report.memory and tracemalloc.is_tracing()
+        if self.trace_memory:
+            # the peak of the parent stage so far is kept before resetting the peak for this stage
+            self.start_memory, self.parent_peak = tracemalloc.get_traced_memory()
+            self.child_peak = 0
+            tracemalloc.reset_peak()
+            _memory_stages.append(self)
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.report is None or exc_type is not None:
+            if self.report is not None and self.trace_memory:
+                _memory_stages.remove(self)
+            return False
+        time_s = time.perf_counter() - self.start_time
+
+        peak_mb = None
+        if self.trace_memory:
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            _memory_stages.pop()
+            if _memory_stages:
+                parent = _memory_stages[-1]
+                parent.child_peak = max(parent.child_peak, self.parent_peak, peak)
+            peak_mb = (peak - self.start_memory) / 1024**2
+
+        self.report.add(self.function, self.stage, time_s, rows=self.rows, peak_mb=peak_mb)
+        return False
@@ -0,0 +1,26 @@
+import argparse
+import os
+
+import numpy as np
+
+from mobmetric.motifs import MOTIF_CATALOGUE_PATH, _build_motif_catalogue
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "output",
+        default=MOTIF_CATALOGUE_PATH,
+        nargs="?",
+        help="File to store the motif catalogue (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    catalogue = _build_motif_catalogue(max_nodes=6)
+    for n, codes in catalogue.items():
+        print(f"{n} nodes: {len(codes)} motifs")
+
+    log_dir = os.path.dirname(args.output)
+    if log_dir and not os.path.exists(log_dir):
+        os.makedirs(log_dir, exist_ok=True)
+    # delta encoding of the sorted codes keeps the compressed file small
+    np.savez_compressed(args.output, **{f"codes_{n}": np.diff(codes, prepend=0) for n, codes in catalogue.items()})
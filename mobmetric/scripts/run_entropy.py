@@ -2,13 +2,14 @@ import argparse
 import os
 
 import numpy as np
-import pandas as pd
 import random
 import scipy.stats as stats
 
 import matplotlib.pyplot as plt
 
-from mobmetric import random_entropy, uncorrelated_entropy, real_entropy
+from mobmetric import random_entropy, uncorrelated_entropy, real_entropy, compute_metrics
+from mobmetric.io import read_staypoints
+from mobmetric.cache import get_compute
 
 
 def setup_seed(seed):
@@ -36,28 +37,52 @@ if __name__ == "__main__":
         nargs="?",
         help="Dataset for running (default: %(default)s)",
     )
+    parser.add_argument(
+        "--format",
+        default="csv",
+        choices=["csv", "parquet", "feather"],
+        help="File format of the input dataset data/input/<dataset>.<format> (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cache",
+        default=None,
+        help="Directory of the result cache, results are reused for unchanged inputs (default: no cache)",
+    )
     args = parser.parse_args()
 
-    sps = pd.read_csv(os.path.join("data", "input", f"{args.dataset}.csv"), index_col="index")
+    # entropy only requires the location sequences
+    sps = read_staypoints(
+        os.path.join("data", "input", f"{args.dataset}.{args.format}"),
+        file_format=args.format,
+        columns=["user_id", "location_id"],
+        # CSV files store the index as column, Parquet and Feather files restore it from their metadata
+        index_col="index" if args.format == "csv" else None,
+        geometry=False,
+    )
+
+    # reuse the results of previous runs if a cache is given
+    compute = get_compute(args.cache)
 
     entropy_result_ls = []
     entropy_legend_ls = []
     if args.method == "random":
-        entropy_result_ls.append(random_entropy(sps, print_progress=False))
+        entropy_result_ls.append(compute(random_entropy, sps, print_progress=False))
         entropy_legend_ls.append("Random entropy")
         print(f"Random Entropy: {np.mean(entropy_result_ls[0]):.2f}\t")
     elif args.method == "uncorrelated":
-        entropy_result_ls.append(uncorrelated_entropy(sps, print_progress=False))
+        entropy_result_ls.append(compute(uncorrelated_entropy, sps, print_progress=False))
         entropy_legend_ls.append("Uncorrelated entropy")
         print(f"Uncorrelated Entropy: {np.mean(entropy_result_ls[0]):.2f}\t")
     elif args.method == "real":
-        entropy_result_ls.append(real_entropy(sps, print_progress=False, n_jobs=-1))
+        entropy_result_ls.append(compute(real_entropy, sps, print_progress=False, n_jobs=-1))
         entropy_legend_ls.append("Real entropy")
         print(f"Real Entropy: {np.mean(entropy_result_ls[0]):.2f}\t")
     elif args.method == "all":
-        entropy_result_ls.append(random_entropy(sps, print_progress=False))
-        entropy_result_ls.append(uncorrelated_entropy(sps, print_progress=False))
-        entropy_result_ls.append(real_entropy(sps, print_progress=False, n_jobs=-1))
+        # single pass over the users for all entropies
+        entropy_df = compute(compute_metrics, sps, metrics=["random", "uncorrelated", "real"])
+        entropy_result_ls.append(entropy_df["randomEntropy"])
+        entropy_result_ls.append(entropy_df["uncorrelatedEntropy"])
+        entropy_result_ls.append(entropy_df["realEntropy"])
         entropy_legend_ls.append("Random entropy")
         entropy_legend_ls.append("Uncorrelated entropy")
         entropy_legend_ls.append("Real entropy")
@@ -2,15 +2,14 @@ import argparse
 import os
 
 import numpy as np
-import pandas as pd
-import geopandas as gpd
-from shapely import wkt
-
 
 import matplotlib.pyplot as plt
-import powerlaw
 
 from mobmetric import radius_gyration, jump_length, location_frquency, wait_time
+from mobmetric import jump_length_histogram, wait_time_histogram
+from mobmetric.distributions import LogHistogram, merge_histograms, fit_distributions
+from mobmetric.io import read_staypoints, iter_staypoints
+from mobmetric.cache import get_compute
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -34,21 +33,63 @@ if __name__ == "__main__":
         nargs="?",
         help="Dataset for running (default: %(default)s)",
     )
+    parser.add_argument(
+        "--format",
+        default="csv",
+        choices=["csv", "parquet", "feather"],
+        help="File format of the input dataset data/input/<dataset>.<format> (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cache",
+        default=None,
+        help="Directory of the result cache, results are reused for unchanged inputs (default: no cache)",
+    )
+    parser.add_argument(
+        "--fit",
+        default="binned",
+        choices=["binned", "exact"],
+        help="Fit from a log-binned histogram or from a subsample of the values (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--sample-size",
+        default=1000000,
+        type=int,
+        help="Maximal number of values for the exact fit (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--chunksize",
+        default=None,
+        type=int,
+        help="Read the dataset in chunks of complete users and accumulate the histogram of jump or wait "
+        "(binned fit only, default: read at once)",
+    )
 
     args = parser.parse_args()
 
-    sp = pd.read_csv(os.path.join("data", "input", f"{args.dataset}.csv"), index_col="index")
-    sp["geometry"] = sp["geometry"].apply(wkt.loads)
-    sp = gpd.GeoDataFrame(sp, geometry="geometry", crs="EPSG:4326")
+    path = os.path.join("data", "input", f"{args.dataset}.{args.format}")
+    # CSV files store the index as column, Parquet and Feather files restore it from their metadata
+    index_col = "index" if args.format == "csv" else None
+    # jump and wait histograms are accumulated chunk by chunk in O(bins) memory
+    streaming = args.chunksize is not None and args.metric in ["jump", "wait"] and args.fit == "binned"
+    if not streaming:
+        sp = read_staypoints(path, file_format=args.format, index_col=index_col)
+
+    # reuse the results of previous runs if a cache is given
+    compute = get_compute(args.cache)
 
+    hist = None
     if args.metric == "jump":
-        metric = jump_length(sp)
+        if streaming:
+            chunks = iter_staypoints(path, file_format=args.format, chunksize=args.chunksize, index_col=index_col)
+            hist = merge_histograms(jump_length_histogram(chunk) for chunk in chunks)
+        else:
+            metric = compute(jump_length, sp)
         xlabel = "$\Delta r\,(m)$"
         ylabel = "$P(\Delta r)$"
         xmin = 1
 
     elif args.metric == "rg":
-        metric = radius_gyration(sp, method=args.method, print_progress=True)
+        metric = compute(radius_gyration, sp, method=args.method, print_progress=True)
         # transform to km
         metric = metric / 1000
 
@@ -57,14 +98,20 @@ if __name__ == "__main__":
         xmin = 1
 
     elif args.metric == "wait":
-        metric = wait_time(sp)
+        if streaming:
+            chunks = iter_staypoints(
+                path, file_format=args.format, chunksize=args.chunksize, index_col=index_col, geometry=False
+            )
+            hist = merge_histograms(wait_time_histogram(chunk) for chunk in chunks)
+        else:
+            metric = wait_time(sp)
 
         xlabel = "$\Delta t\,(hour)$"
         ylabel = "$P(\Delta t)$"
         xmin = 0.1
 
     elif args.metric == "locf":
-        loc_freq = location_frquency(sp)
+        loc_freq = compute(location_frquency, sp)
 
         xlabel = "$f_k$"
         ylabel = "$k$"
@@ -77,14 +124,25 @@ if __name__ == "__main__":
     plt.figure(figsize=(8, 5))
 
     if args.metric == "jump" or args.metric == "rg" or args.metric == "wait":
-        # fit power law
-        fit = powerlaw.Fit(metric, xmin=xmin)
+        # fit power law, truncated power law and lognormal
+        if hist is None:
+            hist = LogHistogram().update(metric)
+        fit = fit_distributions(
+            metric if args.fit == "exact" else hist, xmin=xmin, method=args.fit, sample_size=args.sample_size
+        )
+        print(fit.to_frame())
+        print(fit.comparisons)
 
         # plotting
-        powerlaw.plot_pdf(metric[metric > xmin], label="data")
-        fit.power_law.plot_pdf(linestyle="--", label="powerlaw fit")
-        fit.truncated_power_law.plot_pdf(linestyle="--", label="truncated power law")
-        fit.lognormal.plot_pdf(linestyle="--", label="lognormal fit")
+        centers, pdf = hist.density(xmin)
+        plt.plot(centers, pdf, "o", label="data")
+        x = np.logspace(np.log10(fit.xmin), np.log10(centers.max()), 200)
+        plt.plot(x, fit.pdf("power_law", x), "--", label="powerlaw fit")
+        plt.plot(x, fit.pdf("truncated_power_law", x), "--", label="truncated power law")
+        plt.plot(x, fit.pdf("lognormal", x), "--", label="lognormal fit")
+
+        plt.yscale("log")
+        plt.xscale("log")
     else:
         n = np.arange(len(loc_freq)) + 1
         plt.plot(n, np.power(n, -1.0) / 4, "--", label="$f_k\sim k^{-1}$", color="k")
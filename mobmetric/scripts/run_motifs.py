@@ -1,16 +1,15 @@
 import argparse
 import numpy as np
 import pandas as pd
-import geopandas as gpd
-import datetime
 import os
 
 import scipy.stats as stats
 
-from shapely import wkt
 import matplotlib.pyplot as plt
 
 from mobmetric import mobility_motifs
+from mobmetric.io import read_staypoints
+from mobmetric.cache import get_compute
 
 
 def _get_motifs_proportion(df):
@@ -18,9 +17,6 @@ def _get_motifs_proportion(df):
 
 
 def load_data(sp, time_format):
-    sp["geometry"] = sp["geometry"].apply(wkt.loads)
-    sp = gpd.GeoDataFrame(sp, geometry="geometry", crs="EPSG:4326")
-
     sp.index.name = "id"
     sp.reset_index(inplace=True)
 
@@ -28,25 +24,11 @@ def load_data(sp, time_format):
         sp["started_at"] = pd.to_datetime(sp["started_at"], format="mixed", yearfirst=True, utc=True)
         sp["finished_at"] = pd.to_datetime(sp["finished_at"], format="mixed", yearfirst=True, utc=True)
     elif time_format == "relative":
-
-        def _transfer_time_to_absolute(df, start_time):
-            duration_arr = df["duration"].to_list()[:-1]
-            duration_arr.insert(0, 0)
-            timedelta_arr = np.array([datetime.timedelta(hours=i) for i in np.cumsum(duration_arr)])
-
-            df["started_at"] = timedelta_arr + start_time
-            df["finished_at"] = df["started_at"] + pd.to_timedelta(df["duration"], unit="hours")
-
-            return df
-
-        # transfer duration to absolut time format for each user
-        sp = sp.groupby("user_id", as_index=False).apply(
-            _transfer_time_to_absolute, start_time=datetime.datetime(2023, 1, 1, hour=8)
-        )
-        sp.reset_index(drop=True, inplace=True)
+        # relative time (duration only) is handled by mobility_motifs(), see relative_to_absolute_time()
+        sp = sp.drop(columns=["started_at", "finished_at"], errors="ignore")
     else:
         raise AttributeError(
-            f"time_format unknown. Please check the input arguement. We only support 'absolute', 'relative'. You passed {args.method}"
+            f"time_format unknown. Please check the input arguement. We only support 'absolute', 'relative'. You passed {time_format}"
         )
 
     return sp
@@ -74,16 +56,35 @@ if __name__ == "__main__":
         nargs="?",
         help="Dataset for running (default: %(default)s)",
     )
+    parser.add_argument(
+        "--format",
+        default="csv",
+        choices=["csv", "parquet", "feather"],
+        help="File format of the input dataset data/input/<dataset>.<format> (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cache",
+        default=None,
+        help="Directory of the result cache, results are reused for unchanged inputs (default: no cache)",
+    )
 
     args = parser.parse_args()
 
     # read and preprocess
 
-    sp = pd.read_csv(os.path.join("data", "input", f"{args.dataset}.csv"), index_col="index")
+    # CSV files store the index as column, Parquet and Feather files restore it from their metadata
+    sp = read_staypoints(
+        os.path.join("data", "input", f"{args.dataset}.{args.format}"),
+        file_format=args.format,
+        index_col="index" if args.format == "csv" else None,
+    )
     sp = load_data(sp, time_format=args.time_format)
 
+    # reuse the results of previous runs if a cache is given
+    compute = get_compute(args.cache)
+
     ## get the motifs
-    sp_motifs = mobility_motifs(sp, proportion_filter=args.proportion_filter)
+    sp_motifs = compute(mobility_motifs, sp, proportion_filter=args.proportion_filter)
 
     ## Visualizations
     # get the average proportion
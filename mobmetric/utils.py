@@ -1,11 +1,185 @@
-from joblib import Parallel, delayed
+import heapq
+import sys
+
+import numpy as np
 import pandas as pd
 
-from tqdm import tqdm
+NS_PER_HOUR = 60 * 60 * 10**9
+
+
+def user_segments(user_ids):
+    """
+    Sort staypoints by user and get the segment of each user.
+
+    Parameters
+    ----------
+    user_ids : array-like
+        The "user_id" of each staypoint.
+
+    Returns
+    -------
+    np.array
+        Stable sorting order of the staypoints, the time order within each user is kept.
+
+    np.array
+        Offsets of length n_users + 1, the sorted staypoints of user k are [offsets[k], offsets[k + 1]).
+
+    pandas Index
+        The "user_id" of each user, sorted as in groupby.
+
+    """
+    user_codes, users = pd.factorize(np.asarray(user_ids), sort=True)
+    order = np.argsort(user_codes, kind="stable")
+    offsets = np.searchsorted(user_codes[order], np.arange(len(users) + 1))
+    return order, offsets, pd.Index(users, name="user_id")
+
+
+def relative_to_absolute_time(sp, start_time="2023-01-01 08:00:00"):
+    """
+    Transfer staypoints in relative time format (duration only) to absolute time.
+
+    The staypoints of each user are assumed to be consecutive and start at start_time, i.e., "started_at" is the
+    start_time plus the cumulative duration of the previous staypoints of the user.
+
+    Parameters
+    ----------
+    sp : Geodataframe or DataFrame
+        Staypoints with columns "user_id" and "duration" (in hours), ordered in time per user.
 
+    start_time: str or datetime, default "2023-01-01 08:00:00"
+        Start time of the first staypoint of each user.
 
-def applyParallel(dfGrouped, func, n_jobs, print_progress, **kwargs):
-    df_ls = Parallel(n_jobs=n_jobs)(
-        delayed(func)(group, **kwargs) for _, group in tqdm(dfGrouped, disable=not print_progress)
+    Returns
+    -------
+    (Geo)DataFrame
+        The staypoints with additional columns "started_at" and "finished_at".
+
+    """
+    started_at, finished_at = _relative_time_ns(sp["user_id"].values, sp["duration"].values)
+    start_time = pd.Timestamp(start_time)
+    return sp.assign(
+        started_at=start_time + pd.to_timedelta(started_at, unit="ns"),
+        finished_at=start_time + pd.to_timedelta(finished_at, unit="ns"),
     )
-    return pd.Series(df_ls)
+
+
+def _relative_time_ns(user_ids, durations):
+    """
+    Start and finish time of each staypoint relative to the first staypoint of its user, in int64 nanoseconds.
+
+    Parameters
+    ----------
+    user_ids : np.array
+        The "user_id" of each staypoint, ordered in time per user.
+
+    durations : np.array
+        The "duration" of each staypoint in hours.
+
+    Returns
+    -------
+    np.array
+        The start time offsets.
+
+    np.array
+        The finish time offsets.
+
+    """
+    durations = np.round(np.asarray(durations, dtype=np.float64) * NS_PER_HOUR).astype(np.int64)
+    # cumulative duration within each user
+    user_codes = pd.factorize(user_ids)[0]
+    finished_at = pd.Series(durations).groupby(user_codes).cumsum().values
+    return finished_at - durations, finished_at
+
+
+def apply_segments_parallel(func, arrays, offsets, n_jobs=-1, print_progress=False, n_chunks=None, **kwargs):
+    """
+    Apply a function to every segment (e.g., user) of flat arrays in parallel.
+
+    Segments are batched into chunks balanced by segment length (longest segments are assigned first, to the chunk
+    with the least total length), and each task only receives the arrays, offsets and the segment ids of its chunk.
+    Large arrays are memory mapped by joblib and shared with the workers instead of being pickled per task.
+
+    Parameters
+    ----------
+    func : callable
+        Function called as func(*segment_arrays, **kwargs) for each segment.
+
+    arrays : tuple
+        Flat np.arrays, sorted by segment.
+
+    offsets : np.array
+        Offsets of length n_segments + 1, segment k is [offsets[k], offsets[k + 1]) of each array.
+
+    n_jobs: int, default -1
+        Number of parallel jobs, passed to joblib.
+
+    print_progress: boolen, default False
+        Show per-chunk progress if set to True.
+
+    n_chunks: int, default None
+        Number of chunks. Defaults to 4 chunks per job.
+
+    Returns
+    -------
+    np.array
+        The results of func for each segment, in the order of the segments.
+
+    """
+    from joblib import Parallel, delayed, effective_n_jobs
+    from tqdm import tqdm
+
+    offsets = np.asarray(offsets)
+    n_segments = len(offsets) - 1
+    if n_chunks is None:
+        n_chunks = 4 * effective_n_jobs(n_jobs)
+    chunks = _balanced_chunks(np.diff(offsets), n_chunks)
+
+    chunk_results = Parallel(n_jobs=n_jobs)(
+        delayed(_apply_segments)(func, arrays, offsets, segments, kwargs)
+        for segments in tqdm(chunks, disable=not print_progress)
+    )
+
+    results = [None] * n_segments
+    for segments, values in zip(chunks, chunk_results):
+        for segment, value in zip(segments, values):
+            results[segment] = value
+    return np.asarray(results)
+
+
+def _apply_segments(func, arrays, offsets, segments, kwargs):
+    """Apply func to the given segments of the arrays, see apply_segments_parallel()."""
+    return [func(*(array[offsets[k] : offsets[k + 1]] for array in arrays), **kwargs) for k in segments]
+
+
+def _balanced_chunks(lengths, n_chunks):
+    """
+    Partition segments into at most n_chunks chunks with similar total length (longest processing time first).
+
+    Parameters
+    ----------
+    lengths : np.array
+        Length of each segment.
+
+    n_chunks : int
+        Maximum number of chunks.
+
+    Returns
+    -------
+    list
+        Lists of segment ids, chunks with the longest segments first.
+
+    """
+    n_chunks = max(1, min(n_chunks, len(lengths)))
+    # heap of (total length, chunk id)
+    heap = [(0, i) for i in range(n_chunks)]
+    chunks = [[] for _ in range(n_chunks)]
+    for segment in np.argsort(-np.asarray(lengths), kind="stable"):
+        total, i = heapq.heappop(heap)
+        chunks[i].append(int(segment))
+        heapq.heappush(heap, (total + int(lengths[segment]), i))
+    return [chunk for chunk in chunks if len(chunk)]
+
+
+def _is_geodataframe(sp):
+    """True if sp is a GeoDataFrame, without importing geopandas (a GeoDataFrame requires geopandas to be imported)."""
+    return "geopandas" in sys.modules and isinstance(sp, sys.modules["geopandas"].GeoDataFrame)
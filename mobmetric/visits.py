@@ -0,0 +1,331 @@
+import numpy as np
+import pandas as pd
+
+
+class VisitMatrix:
+    """
+    Sparse user x location matrix of visit counts and durations in CSR layout.
+
+    The visited (user, location) pairs are sorted by user and location. The pairs of user k are
+    [indptr[k], indptr[k + 1]), with location codes "indices", visit "counts" and summed "durations". The matrix is
+    built once with a hash based factorization, and shared by the frequency based metrics (ranked visit frequency, random and
+    uncorrelated entropy, and k-radius of gyration) instead of grouping the staypoints for each metric.
+
+    Use VisitMatrix.from_staypoints() to construct the matrix.
+
+    Attributes
+    ----------
+    users : pandas Index
+        The "user_id" of each row, sorted as in groupby.
+
+    locations : pandas Index
+        The "location_id" of each column, sorted. Missing locations (NaN) are kept as the last column, as they count
+        as a visited location in random_entropy(), but are ignored by the other metrics.
+
+    indptr, indices, counts : np.array
+        CSR row offsets, column (location) codes and visit counts of the visited pairs.
+
+    durations : np.array or None
+        Summed "duration" of the visited pairs, None if the staypoints have no "duration" column.
+
+    xs, ys : np.array or None
+        Coordinates of the location of each pair (of its first visit), None if not requested.
+
+    planar : boolen
+        True if the coordinates are projected.
+
+    """
+
+    def __init__(self, users, locations, indptr, indices, counts, durations=None, xs=None, ys=None, planar=False):
+        self.users = users
+        self.locations = locations
+        self.indptr = indptr
+        self.indices = indices
+        self.counts = counts
+        self.durations = durations
+        self.xs = xs
+        self.ys = ys
+        self.planar = planar
+
+    @classmethod
+    def from_staypoints(cls, sp, coordinates=False):
+        """
+        Build the visit matrix from staypoints.
+
+        Parameters
+        ----------
+        sp : Geodataframe or DataFrame
+            Staypoints with columns "user_id" and "location_id", and optionally "duration" (in hours).
+
+        coordinates: boolen, default False
+            If True, store the coordinates of each visited location for radius_gyration(), see
+            mobmetric.radius_gyration() for the supported formats.
+
+        Returns
+        -------
+        VisitMatrix
+            The visit matrix.
+
+        """
+        user_codes, users = pd.factorize(np.asarray(sp["user_id"]), sort=True)
+        # missing locations are sorted last
+        loc_codes, locations = pd.factorize(np.asarray(sp["location_id"]), sort=True, use_na_sentinel=False)
+        durations = np.asarray(sp["duration"], dtype=np.float64) if "duration" in sp.columns else None
+
+        if coordinates:
+            from mobmetric.metrics import _get_coordinates
+
+            xs, ys, planar = _get_coordinates(sp)
+        else:
+            xs, ys, planar = None, None, False
+
+        return cls._from_codes(
+            user_codes, pd.Index(users, name="user_id"), loc_codes, locations, durations, xs=xs, ys=ys, planar=planar
+        )
+
+    @classmethod
+    def _from_codes(cls, user_codes, users, loc_codes, locations, durations=None, xs=None, ys=None, planar=False):
+        """Build the visit matrix from user and location codes of each staypoint, see from_staypoints()."""
+        n_locs = max(len(locations), 1)
+        # hash based factorization of the pairs is faster than np.unique with inverse
+        inverse, keys = pd.factorize(np.asarray(user_codes, dtype=np.int64) * n_locs + loc_codes, sort=True)
+        counts = np.bincount(inverse, minlength=len(keys))
+        pair_users = keys // n_locs
+        indptr = np.searchsorted(pair_users, np.arange(len(users) + 1))
+        if durations is not None:
+            durations = np.bincount(inverse, weights=durations, minlength=len(keys))
+        if xs is not None:
+            # coordinates of the first visit, the last assignment of repeated indices wins
+            first_visits = np.empty(len(keys), dtype=np.int64)
+            first_visits[inverse[::-1]] = np.arange(len(inverse))[::-1]
+            xs, ys = xs[first_visits], ys[first_visits]
+
+        return cls(
+            users,
+            pd.Index(locations, name="location_id"),
+            indptr,
+            keys % n_locs,
+            counts,
+            durations=durations,
+            xs=xs,
+            ys=ys,
+            planar=planar,
+        )
+
+    @property
+    def shape(self):
+        """(number of users, number of locations)"""
+        return len(self.users), len(self.locations)
+
+    @property
+    def nnz(self):
+        """Number of visited (user, location) pairs."""
+        return len(self.indices)
+
+    @property
+    def pair_users(self):
+        """User code of each visited pair."""
+        return np.repeat(np.arange(len(self.users)), np.diff(self.indptr))
+
+    def _get_values(self, method):
+        """Visit counts or durations of the pairs."""
+        if method not in ["duration", "count"]:
+            raise AttributeError(
+                f"Method unknown. Please check the input arguement. We only support 'duration', 'count'. You passed {method}"
+            )
+        if method == "duration":
+            if self.durations is None:
+                raise AttributeError("Durations not found. The staypoints shall contain column 'duration'.")
+            return self.durations
+        return self.counts
+
+    def _get_valid(self):
+        """True for the pairs of non missing locations."""
+        return np.asarray(self.locations.notna())[self.indices]
+
+    def ranks(self, method="count"):
+        """
+        Rank of each visited pair within its user, the most visited location has rank 1.
+
+        Locations with equal visits are ranked in the order of their "location_id" (rank method "first"). Missing
+        locations are not ranked.
+
+        Parameters
+        ----------
+        method: string, {"duration", "count"}, default "count"
+            Rank by visit count or by total duration.
+
+        Returns
+        -------
+        np.array
+            The rank of each pair, 0 for missing locations.
+
+        """
+        values = self._get_values(method)
+        valid = self._get_valid()
+        pair_users = self.pair_users
+        # segment sort: by user, then by decreasing value, stable for ties (pairs are sorted by location)
+        order = np.lexsort((-values, ~valid, pair_users))
+        ranks = np.empty(len(order), dtype=np.int64)
+        ranks[order] = np.arange(len(order)) - self.indptr[pair_users[order]] + 1
+        ranks[~valid] = 0
+        return ranks
+
+    def top_k(self, k, method="count"):
+        """
+        The k most visited locations of each user.
+
+        Parameters
+        ----------
+        k : int
+            Number of locations per user.
+
+        method: string, {"duration", "count"}, default "count"
+            Rank by visit count or by total duration, see ranks().
+
+        Returns
+        -------
+        pandas DataFrame
+            One row per user and rank (up to k), with columns "user_id", "rank", "location_id", "count" and
+            "duration" (if available), sorted by user and rank.
+
+        """
+        ranks = self.ranks(method)
+        is_top = (ranks >= 1) & (ranks <= k)
+        df = pd.DataFrame(
+            {
+                "user_id": self.users.values[self.pair_users[is_top]],
+                "rank": ranks[is_top],
+                "location_id": self.locations.values[self.indices[is_top]],
+                "count": self.counts[is_top],
+            }
+        )
+        if self.durations is not None:
+            df["duration"] = self.durations[is_top]
+        return df.sort_values(["user_id", "rank"], kind="stable").reset_index(drop=True)
+
+    def rank_frequency(self, method="count"):
+        """
+        Mean visit frequency of each location rank, see mobmetric.location_frquency().
+
+        Parameters
+        ----------
+        method: string, {"duration", "count"}, default "count"
+            Rank and average by visit count or by total duration.
+
+        Returns
+        -------
+        np.array
+            The normalized mean visit frequency of rank 1, 2, ...
+
+        """
+        values = self._get_values(method)
+        ranks = self.ranks(method)
+        valid = ranks > 0
+        # mean over the users that visited at least rank locations
+        p_loc = np.bincount(ranks[valid], weights=values[valid])[1:] / np.bincount(ranks[valid])[1:]
+        return p_loc / p_loc.sum()
+
+    def random_entropy(self):
+        """
+        Random entropy of each user, see mobmetric.random_entropy().
+
+        Returns
+        -------
+        pandas Series
+            The random entropy of each user.
+
+        """
+        s = np.log(np.diff(self.indptr))
+        return pd.Series(s, index=self.users, name="randomEntropy")
+
+    def uncorrelated_entropy(self, method="count"):
+        """
+        Uncorrelated entropy of each user, see mobmetric.uncorrelated_entropy().
+
+        Parameters
+        ----------
+        method: string, {"duration", "count"}, default "count"
+            Location probabilities from visit counts or from durations.
+
+        Returns
+        -------
+        pandas Series
+            The uncorrelated entropy of each user.
+
+        """
+        values = self._get_values(method)
+        valid = self._get_valid()
+        pair_users, values = self.pair_users[valid], values[valid]
+
+        n_users = len(self.users)
+        locs_prob = values / np.bincount(pair_users, weights=values, minlength=n_users)[pair_users]
+        s = -np.bincount(pair_users, weights=locs_prob * np.log(locs_prob), minlength=n_users)
+        return pd.Series(s, index=self.users, name="uncorrelatedEntropy")
+
+    def radius_gyration(self, k=None, method="count"):
+        """
+        (k-)radius of gyration of each user from the visited locations.
+
+        The k-radius of gyration only considers the k most visited locations of each user [1], weighted by their
+        visits. Requires the matrix to be built with coordinates=True.
+
+        Parameters
+        ----------
+        k: int, default None
+            Number of most visited locations per user. Consider all locations if None, which equals
+            mobmetric.radius_gyration() if each location has a single coordinate.
+
+        method: string, {"duration", "count"}, default "count"
+            Rank and weight the locations by visit count or by total duration.
+
+        Returns
+        -------
+        pandas Series
+            The (k-)radius of gyration of each user.
+
+        References
+        ----------
+        [1] Pappalardo, L., Simini, F., Rinzivillo, S., Pedreschi, D., Giannotti, F., & Barabási, A. L. (2015). Returners and explorers dichotomy in human mobility. Nature Communications, 6(1), 8166.
+
+        """
+        from mobmetric.metrics import _radius_gyration
+
+        if self.xs is None:
+            raise AttributeError("Coordinates not found. Please build the visit matrix with coordinates=True.")
+
+        values = self._get_values(method)
+        if k is None:
+            selected = np.ones(self.nnz, dtype=bool)
+        else:
+            ranks = self.ranks(method)
+            selected = (ranks > 0) & (ranks <= k)
+
+        rg = _radius_gyration(
+            self.pair_users[selected],
+            len(self.users),
+            self.xs[selected],
+            self.ys[selected],
+            values[selected].astype(np.float64),
+            self.planar,
+        )
+        return pd.Series(rg, index=self.users, name="radiusGyration" if k is None else f"radiusGyration{k}")
+
+    def to_scipy(self, method="count"):
+        """
+        The visit matrix as scipy sparse matrix.
+
+        Parameters
+        ----------
+        method: string, {"duration", "count"}, default "count"
+            Values of the matrix.
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            The matrix of shape (number of users, number of locations).
+
+        """
+        from scipy.sparse import csr_matrix
+
+        return csr_matrix((self._get_values(method), self.indices, self.indptr), shape=self.shape)
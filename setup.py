@@ -21,6 +21,8 @@ setup(
     license="Apache-2.0",
     url="https://github.com/irmlma/mobility-metrics",
     install_requires=["geopandas", "trackintel", "powerlaw", "networkx"],
+    extras_require={"numba": ["numba>=0.57"]},
+    entry_points={"console_scripts": ["mobmetric = mobmetric.cli:main"]},
     classifiers=[
         "License :: OSI Approved :: Apache Software License",
         "Intended Audience :: Science/Research",
@@ -31,5 +33,6 @@ setup(
         "Topic :: Software Development :: Libraries :: Python Modules",
     ],
     packages=find_packages("."),
+    package_data={"mobmetric": ["data/*.npz"]},
     python_requires=">=3.9",
 )